@@ -13,12 +13,29 @@ import os
 import sqlite3
 import random
 import asyncio
+import bisect
+import cProfile
+import functools
+import hashlib
+import heapq
+import json
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import unicodedata
+from collections import Counter, OrderedDict
 import aiohttp
+from aiohttp import web
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Callable, Tuple, AsyncIterator, NamedTuple
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from dotenv import load_dotenv
 
 # ==================== LOAD TOKEN ====================
@@ -29,22 +46,97 @@ TOKEN = os.getenv("DISCORD_BOT_TOKEN")
 # ==================== CONFIG / CONSTANTS ====================
 
 DB_PATH = "anime_card_bot.db"
+DB_READERS = 4                  # pooled read connections (one per reader thread)
+DB_BUSY_TIMEOUT_MS = 5000       # how long a connection waits on a locked db
+# group commit: a write waits at most this long for others to share its
+# transaction (its durability window), and a batch holds at most this many
+DB_COMMIT_WINDOW_MS = float(os.getenv("DB_COMMIT_WINDOW_MS", "2"))
+DB_COMMIT_BATCH = int(os.getenv("DB_COMMIT_BATCH", "64"))
 
 ROLL_LIMIT = 10                 # rolls per batch
+MULTI_ROLL_MAX = 10             # most rolls one $w <n> / $wx can spend (Discord allows 10 embeds)
+ROLL_OWNED_CARDS = os.getenv("ROLL_OWNED_CARDS", "0") == "1"  # 1 = claimed cards stay in the roll pool
+# chance of each rarity per roll, "rarity:weight" pairs (normalised; empty rarities drop out)
+RARITY_RATES = os.getenv("RARITY_RATES", "1:55,2:25,3:12,4:6,5:2")
+# optional banner: cards from these series ("|"-separated) are BANNER_BOOST times as likely
+# as other cards of the same rarity. The rarity rates above don't change.
+BANNER_SERIES = [x.strip() for x in os.getenv("BANNER_SERIES", "").split("|") if x.strip()]
+BANNER_BOOST = float(os.getenv("BANNER_BOOST", "3"))
 ROLL_RESET_HOURS = 1            # hours before new batch of rolls
 CLAIM_COOLDOWN_HOURS = 3        # time between successful $claim
 DAILY_COOLDOWN_HOURS = 20       # time between $daily rewards
 VOTE_RESET_HOURS = 12           # cooldown for $rolls reset
 CLAIM_WINDOW_SECONDS = 120      # how long after $w you can claim that roll
+# where open claim windows live: "memory" (this process) or "sqlite" (the
+# roll_windows table, shared by every bot process on the same db file)
+ROLL_WINDOW_BACKEND = os.getenv("ROLL_WINDOW_BACKEND", "memory")
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))  # >0: this process runs only shard SHARD_ID
+SHARD_ID = int(os.getenv("SHARD_ID", "0"))
+
+ROLL_RESET_SECONDS = ROLL_RESET_HOURS * 3600
+CLAIM_COOLDOWN_SECONDS = CLAIM_COOLDOWN_HOURS * 3600
+DAILY_COOLDOWN_SECONDS = DAILY_COOLDOWN_HOURS * 3600
+VOTE_RESET_SECONDS = VOTE_RESET_HOURS * 3600
+# users kept in memory. Off by default when sharded: each process would
+# serve cash / cooldowns it can't see other shards write
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "0" if SHARD_COUNT > 1 else "10000"))
+# 1 = find who to ping on a roll in the in-memory WishIndex. Off by default
+# when sharded, for the same reason: other shards' $wish / $unwish / claims
+# never reach this process's copy, so rolls read the wishes table instead
+WISH_INDEX = os.getenv("WISH_INDEX", "0" if SHARD_COUNT > 1 else "1") == "1"
+INVENTORY_PAGE_SIZE = 20        # cards per $inventory page
+INVENTORY_VIEW_SECONDS = 180    # how long the page buttons stay live
+LEADERBOARD_SIZE = 10
+SEARCH_PAGE_SIZE = 10
+SERIES_LIST_MAX = 25            # cards listed by $series before "... and N more"
+WISHLIST_MAX = 10               # wishes per user
+SEARCH_MAX_CANDIDATES = 2000    # matches ranked per query; bounds the cost of "a"-style searches
+SEARCH_FUZZY_MIN_LENGTH = 4     # shorter words are never typo-corrected, only prefix-matched
+SEARCH_FUZZY_EDITS = 2          # max typos per word of 7+ letters (1 below that)
+SEARCH_FUZZY_TERMS = 8          # near words OR'd in per query word
+SEARCH_FUZZY_CANDIDATES = 200   # near-word candidates scored per query word, at most
+SEARCH_WORD_MAX_LENGTH = 24     # longer catalog words are left out of the typo index
+LEADERBOARD_TTL_SECONDS = 60    # cached top-N is also dropped on every claim
 
 CASH_DAILY_MIN = 200
 CASH_DAILY_MAX = 400
 CASH_CLAIM_MIN = 50
 CASH_CLAIM_MAX = 200
 
+ANILIST_URL = os.getenv("ANILIST_URL", "https://graphql.anilist.co")
+ANILIST_PER_PAGE = 50           # AniList's max page size
+ANILIST_CONCURRENCY = 4         # pages in flight at once
+ANILIST_RATE_PER_MINUTE = 90    # starting budget until response headers say otherwise
+ANILIST_MAX_RETRIES = 5
+ANILIST_TIMEOUT_SECONDS = 30
+ANILIST_CACHE_DIR = os.getenv("ANILIST_CACHE_DIR", "anilist_cache")
+ANILIST_CACHE_TTL_HOURS = int(os.getenv("ANILIST_CACHE_TTL_HOURS", "168"))
+ANILIST_CACHE_MAX_MB = int(os.getenv("ANILIST_CACHE_MAX_MB", "256"))
+ANILIST_OFFLINE = os.getenv("ANILIST_OFFLINE", "0") == "1"  # serve only from cache
+POPULATE_MAX = 10000            # upper clamp for $populate <n>
+POPULATE_PROGRESS_SECONDS = 2   # min gap between $populate progress edits
+SYNC_REFRESH_PAGES = 4          # most-favourited pages re-checked by each $sync
+SYNC_INTERVAL_HOURS = int(os.getenv("SYNC_INTERVAL_HOURS", "0"))  # 0 = no scheduled sync
+
+# share of command / db calls whose latency is timed; calls and errors are always counted
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "1"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # Prometheus text at /metrics; 0 = no endpoint
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+LOOP_LAG_INTERVAL_SECONDS = 1   # how often the event-loop lag probe runs
+STATS_TOP = 10                  # rows per table in $stats
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")  # where $profile writes its reports
+PROFILE_DEFAULT_SECONDS = 30    # $profile start with no argument
+PROFILE_MAX_SECONDS = 600
+PROFILE_MAX_INVOCATIONS = 100   # upper clamp for $profile start <command> <n>
+PROFILE_SAMPLE_INTERVAL_MS = 5  # stack sampler period
+PROFILE_TRACEMALLOC_FRAMES = 8  # frames kept per allocation traceback
+PROFILE_TOP = 8                 # functions / allocation sites in the channel summary
+
 # Load from environment variables for security
 # Set these in your .env file:
-# GUILD_ID = your_server_id_here (optional, currently unused in this prefix-command version)
+# GUILD_ID = your_server_id_here (optional: the home server. Collections from
+#   before per-server ownership are moved into it, and DMs show it)
 # BOT_OWNER_ID = your_discord_user_id_here (required for owner commands)
 GUILD_ID = int(os.getenv("GUILD_ID", "0"))
 
@@ -60,8 +152,9 @@ def now_utc() -> datetime:
 def dt_to_str(dt: Optional[datetime]) -> Optional[str]:
     return dt.isoformat() if dt else None
 
-def str_to_dt(s: Optional[str]) -> Optional[datetime]:
-    return datetime.fromisoformat(s) if s else None
+def now_ts() -> int:
+    """unix epoch seconds, the unit every cooldown column is stored in."""
+    return int(time.time())
 
 def humanize_delta(td: timedelta) -> str:
     total_seconds = int(td.total_seconds())
@@ -76,23 +169,1170 @@ def humanize_delta(td: timedelta) -> str:
         return f"{minutes}m {seconds}s"
     return f"{seconds}s"
 
-# ==================== DB DECORATOR ====================
-
-def with_db(func):
-    """open/close sqlite for each call so we don't forget commits."""
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        result = func(cursor, *args, **kwargs)
-        conn.commit()
-        conn.close()
-        return result
+# ==================== METRICS ====================
+
+# histogram bucket upper bounds, seconds
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+class Histogram:
+    """Fixed-bucket latency histogram; observe() is one bisect and two adds."""
+
+    __slots__ = ("counts", "total", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """estimate, interpolated inside the bucket the q-th sample falls in."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if i == len(LATENCY_BUCKETS):
+                    break
+                lower = LATENCY_BUCKETS[i - 1] if i else 0.0
+                return min(self.max, lower + (LATENCY_BUCKETS[i] - lower) * (rank - seen) / n)
+            seen += n
+        return self.max
+
+class Timing:
+    """calls / errors (exact) and a latency histogram (sampled) for one name."""
+
+    __slots__ = ("calls", "errors", "latency")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram()
+
+class Metrics:
+    """
+    In-process counters for commands, db functions and the event loop.
+
+    Everything is touched only from the event loop, so there is no locking.
+    start() decides per call whether to time it: at METRICS_SAMPLE_RATE=0
+    a call costs one comparison and a counter bump.
+    """
+
+    def __init__(self, sample_rate: float):
+        self.sample_rate = sample_rate
+        self.started_at = time.monotonic()
+        self._timings: Dict[str, Dict[str, Timing]] = {"command": {}, "db": {}}
+        self.loop_lag = Histogram()
+
+    def timing(self, kind: str, name: str) -> Timing:
+        timings = self._timings[kind]
+        timing = timings.get(name)
+        if timing is None:
+            timing = timings[name] = Timing()
+        return timing
+
+    def timings(self, kind: str) -> Dict[str, Timing]:
+        return self._timings[kind]
+
+    def start(self) -> Optional[float]:
+        """perf_counter() if this call should be timed, else None."""
+        if self.sample_rate >= 1.0 or (self.sample_rate > 0.0 and random.random() < self.sample_rate):
+            return time.perf_counter()
+        return None
+
+    def render(self, gauges: Dict[str, Tuple[str, float]]) -> str:
+        """
+        Prometheus text exposition. gauges: metric name -> (help, value),
+        sampled by the caller at scrape time.
+        """
+        lines = []
+
+        def histogram(name: str, help_text: str, series: List[Tuple[str, Histogram]]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, hist in series:
+                sep = "," if labels else ""
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS + (float("inf"),), hist.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {cumulative}')
+                braces = f"{{{labels}}}" if labels else ""
+                lines.append(f"{name}_sum{braces} {hist.total}")
+                lines.append(f"{name}_count{braces} {hist.count}")
+
+        def counter(name: str, help_text: str, series: List[Tuple[str, int]]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series:
+                lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+        for kind, label in (("command", "command"), ("db", "func")):
+            timings = sorted(self._timings[kind].items())
+            histogram(
+                f"gacha_{kind}_latency_seconds",
+                f"{kind} latency (sampled at {self.sample_rate:g}).",
+                [(f'{label}="{name}"', t.latency) for name, t in timings],
+            )
+            counter(f"gacha_{kind}_calls_total", f"{kind} calls.",
+                    [(f'{label}="{name}"', t.calls) for name, t in timings])
+            counter(f"gacha_{kind}_errors_total", f"{kind} calls that raised.",
+                    [(f'{label}="{name}"', t.errors) for name, t in timings])
+
+        histogram("gacha_event_loop_lag_seconds",
+                  "time a ready callback waits for the event loop.", [("", self.loop_lag)])
+        for name, (help_text, value) in gauges.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics(METRICS_SAMPLE_RATE)
+
+# ==================== PROFILING ====================
+
+class Profiler:
+    """
+    cProfile, a wall-clock stack sampler and tracemalloc, armed at runtime by
+    $profile, either for a time window or for the next N runs of a command.
+
+    Disarmed it costs one `profiler.command is None` check per command: no
+    profile hook is installed, no sampler thread runs, tracemalloc is off.
+    In command mode cProfile and the sampler only record while a run of that
+    command is in flight, though coroutines interleaving with it still show.
+
+    cProfile hooks the thread that enables it (the event loop); the sampler
+    walks sys._current_frames() for every thread, so time spent in the db
+    threads shows up in the collapsed stacks.
+    """
+
+    def __init__(self, out_dir: str, interval_ms: float):
+        self.out_dir = out_dir
+        self.interval = interval_ms / 1000.0
+        self.active = False
+        self.command: Optional[str] = None   # command mode: qualified name
+        self.remaining = 0                   # command mode: runs left
+        self.label = ""
+        self.started_at = 0.0
+        self.channel = None                  # where the finished report goes
+        self._stamp = ""
+        self._dumps = 0
+        self._profile: Optional[cProfile.Profile] = None
+        self._stacks: Counter = Counter()
+        self._stacks_lock = threading.Lock()
+        self._samples = 0
+        self._recording = threading.Event()
+        self._stopping = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._in_flight = 0
+        self._owns_tracemalloc = False
+        self._alloc_baseline = None
+        self.timer: Optional[asyncio.Task] = None  # window mode auto-stop
+
+    def start(self, label: str, command: Optional[str] = None, runs: int = 0):
+        self.active = True
+        self.label = label
+        self.started_at = time.monotonic()
+        self._stamp = time.strftime("%Y%m%d-%H%M%S")
+        self._dumps = 0
+        self._profile = cProfile.Profile()
+        self._stacks = Counter()
+        self._samples = 0
+        self._in_flight = 0
+        self._owns_tracemalloc = not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+        self._alloc_baseline = tracemalloc.take_snapshot()
+        self._stopping.clear()
+        self._sampler = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+        self._sampler.start()
+        self.command, self.remaining = command, runs
+        if command is None:
+            self._resume()
+
+    def _resume(self):
+        if not self._recording.is_set():
+            self._profile.enable()
+            self._recording.set()
+
+    def _pause(self):
+        if self._recording.is_set():
+            self._recording.clear()
+            self._profile.disable()
+
+    def enter(self, command: str):
+        """before_invoke, command mode."""
+        if command == self.command and self.remaining > 0:
+            self._in_flight += 1
+            self._resume()
+
+    def exit(self, command: str) -> bool:
+        """after_invoke, command mode; True once the last requested run finished."""
+        if command != self.command or self._in_flight <= 0:
+            return False
+        self._in_flight -= 1
+        self.remaining -= 1
+        if self._in_flight == 0:
+            self._pause()
+        return self.remaining <= 0 and self._in_flight == 0
+
+    def _sample(self):
+        me = threading.get_ident()
+        while not self._stopping.wait(self.interval):
+            if not self._recording.is_set():
+                continue
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                stacks.append(";".join(reversed(stack)))
+            with self._stacks_lock:
+                self._stacks.update(stacks)
+                self._samples += 1
+
+    def _snapshot(self) -> Tuple[pstats.Stats, Dict[str, int], int]:
+        # pstats has to be taken on the loop thread, where the profile hook lives
+        stats = pstats.Stats(self._profile)
+        with self._stacks_lock:
+            return stats, dict(self._stacks), self._samples
+
+    async def dump(self) -> Optional[Dict]:
+        """write the report so far without disarming; None if not running."""
+        if not self.active:
+            return None
+        seconds = time.monotonic() - self.started_at
+        recording = self._recording.is_set()
+        self._pause()
+        stats, stacks, samples = self._snapshot()
+        if recording and (self.command is None or self._in_flight):
+            self._resume()
+        self._dumps += 1
+        name = f"{self._stamp}-{self.label}-dump{self._dumps}"
+        return await asyncio.to_thread(
+            self._write_report, name, seconds, stats, stacks, samples, self._alloc_baseline
+        )
+
+    async def stop(self) -> Optional[Dict]:
+        """
+        disarm and write the final report; None if already stopped. All
+        state is swapped out before the first await, so a `$profile stop`
+        racing the window timer (or a command's last run) reports once.
+        """
+        if not self.active:
+            return None
+        seconds = time.monotonic() - self.started_at
+        self.active, self.remaining, self.command = False, 0, None
+        timer, self.timer = self.timer, None
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+        self._pause()
+        self._stopping.set()
+        sampler, self._sampler = self._sampler, None
+        baseline, self._alloc_baseline = self._alloc_baseline, None
+        owns_tracemalloc = self._owns_tracemalloc
+        name = f"{self._stamp}-{self.label}"
+
+        await asyncio.to_thread(sampler.join)
+        stats, stacks, samples = self._snapshot()
+        self._profile = None
+        report = await asyncio.to_thread(
+            self._write_report, name, seconds, stats, stacks, samples, baseline
+        )
+        # unless a new profile started (and took tracemalloc over) meanwhile
+        if owns_tracemalloc and not self.active:
+            tracemalloc.stop()
+        return report
+
+    def _write_report(self, name: str, seconds: float, stats: pstats.Stats,
+                      stacks: Dict[str, int], samples: int, baseline) -> Dict:
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, name)
+        paths = {"pstats": base + ".pstats", "stacks": base + ".collapsed", "alloc": base + ".alloc.txt"}
+
+        stats.dump_stats(paths["pstats"])
+        # folded stacks: one "frame;frame;frame count" line each (flamegraph.pl, speedscope)
+        with open(paths["stacks"], "w", encoding="utf-8") as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+        # the profiler's own bookkeeping would otherwise top the list
+        noise = [
+            tracemalloc.Filter(False, module.__file__)
+            for module in (tracemalloc, cProfile, pstats)
+        ] + [tracemalloc.Filter(False, "<frozen importlib._bootstrap>")]
+        snapshot = tracemalloc.take_snapshot().filter_traces(noise)
+        baseline = baseline.filter_traces(noise)
+        by_line = snapshot.compare_to(baseline, "lineno")
+        with open(paths["alloc"], "w", encoding="utf-8") as f:
+            f.write(f"top allocation growth since {self.label} started\n\n")
+            for stat in snapshot.compare_to(baseline, "traceback")[:25]:
+                f.write(f"{stat.size_diff / 1024:+.1f} KiB in {stat.count_diff:+d} blocks\n")
+                f.writelines(f"    {line}\n" for line in stat.traceback.format())
+                f.write("\n")
+
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)
+        return {
+            "seconds": seconds,
+            "samples": samples,
+            "paths": paths,
+            "functions": [
+                (f"{func} ({os.path.basename(file)}:{line})", calls, tottime, cumtime)
+                for (file, line, func), (_, calls, tottime, cumtime, _) in functions[:PROFILE_TOP]
+            ],
+            "allocations": [
+                (str(stat.traceback), stat.size_diff, stat.count_diff)
+                for stat in by_line[:PROFILE_TOP]
+            ],
+        }
+
+profiler = Profiler(PROFILE_DIR, PROFILE_SAMPLE_INTERVAL_MS)
+
+# ==================== ASYNC DB LAYER ====================
+
+class AsyncDB:
+    """
+    Long-lived sqlite connections kept off the event loop.
+
+    One writer thread owns the only write connection, so writes are serialized
+    in-process instead of fighting over the file lock. Reads go to a small pool
+    of threads that each hold their own connection; WAL lets them run while the
+    writer is busy. Connections open lazily, the first time each thread runs.
+
+    Writes are group-committed: write() queues the call and a single
+    committer task applies whatever has queued up (within commit_window_ms,
+    up to commit_batch calls) in one transaction, each call inside its own
+    savepoint so one failure doesn't sink its batch-mates. Every caller's
+    future resolves only after the shared COMMIT.
+    """
+
+    def __init__(self, path: str, readers: int = DB_READERS,
+                 commit_window_ms: float = DB_COMMIT_WINDOW_MS,
+                 commit_batch: int = DB_COMMIT_BATCH):
+        self.path = path
+        self.commit_window = commit_window_ms / 1000.0
+        self.commit_batch = max(1, commit_batch)
+        self.commits = 0
+        self.writes = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._committer: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._local = threading.local()
+        self._conns: List[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="db-writer",
+            initializer=self._open,
+        )
+        self._readers = ThreadPoolExecutor(
+            max_workers=readers,
+            thread_name_prefix="db-reader",
+            initializer=self._open,
+        )
+
+    def _open(self):
+        # autocommit mode: the writer issues BEGIN/COMMIT itself
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        self._local.conn = conn
+        with self._conns_lock:
+            self._conns.append(conn)
+
+    def _run_read(self, func: Callable, args, kwargs):
+        cursor = self._local.conn.cursor()
+        try:
+            return func(cursor, *args, **kwargs)
+        finally:
+            cursor.close()
+
+    def _run_batch(self, batch: List[Tuple]) -> List[Tuple[bool, object]]:
+        cursor = self._local.conn.cursor()
+        outcomes = []
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            for func, args, kwargs in batch:
+                cursor.execute("SAVEPOINT op")
+                try:
+                    outcomes.append((True, func(cursor, *args, **kwargs)))
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO op")
+                    outcomes.append((False, e))
+                cursor.execute("RELEASE op")
+            cursor.execute("COMMIT")
+        except BaseException:
+            if self._local.conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            raise
+        finally:
+            cursor.close()
+        return outcomes
+
+    async def read(self, func: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._readers, self._run_read, func, args, kwargs
+        )
+
+    async def write(self, func: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._committer is None or self._committer.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._committer = loop.create_task(self._commit_loop())
+
+        future = loop.create_future()
+        self._queue.put_nowait((func, args, kwargs, future))
+        return await future
+
+    async def _next_batch(self) -> List[Tuple]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.commit_window
+        while len(batch) < self.commit_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _commit_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            calls = [(func, args, kwargs) for func, args, kwargs, _ in batch]
+            try:
+                outcomes = await loop.run_in_executor(self._writer, self._run_batch, calls)
+            except Exception as e:
+                # BEGIN or COMMIT itself failed: nothing in the batch landed
+                outcomes = [(False, e)] * len(batch)
+            else:
+                self.commits += 1
+                self.writes += len(batch)
+
+            for (_, _, _, future), (ok, value) in zip(batch, outcomes):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+            for _ in batch:
+                self._queue.task_done()
+
+    async def aclose(self):
+        """flush queued writes, then close."""
+        if self._committer is not None and not self._committer.done():
+            await self._queue.join()
+            self._committer.cancel()
+        self.close()
+
+    def close(self):
+        """finish queued work, then close every connection."""
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        with self._conns_lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
+
+
+db = AsyncDB(DB_PATH)
+
+def _timed_db(func, run: Callable):
+    """await run(func, ...) and record it under func's name in metrics."""
+    timing = metrics.timing("db", func.__name__)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        t0 = metrics.start()
+        timing.calls += 1
+        try:
+            return await run(func, *args, **kwargs)
+        except Exception:
+            timing.errors += 1
+            raise
+        finally:
+            if t0 is not None:
+                timing.latency.observe(time.perf_counter() - t0)
     return wrapper
 
-# ==================== DB SETUP / QUERIES ====================
+def reads_db(func):
+    """run func(cursor, ...) on a pooled read connection; returns an awaitable."""
+    return _timed_db(func, lambda *a, **kw: db.read(*a, **kw))
 
-@with_db
-def setup_db(cursor):
+def writes_db(func):
+    """run func(cursor, ...) on the writer connection inside one transaction."""
+    return _timed_db(func, lambda *a, **kw: db.write(*a, **kw))
+
+# ==================== ROLL ENGINE ====================
+
+class RollIndex:
+    """
+    card_ids that can come up on a roll, kept in a flat int64 array.
+    Picking is one random index plus a primary-key fetch, instead of
+    ORDER BY RANDOM() sorting the whole cards table on every $w.
+
+    Removed cards are swap-removed (last id moved into the hole, O(1)) and
+    new cards are appended. `_pos` maps card_id -> slot so removal needs no
+    scan. RollPool keeps one of these per rarity bucket.
+    """
+
+    def __init__(self):
+        self._ids = array("q")
+        self._pos: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, card_id: int) -> bool:
+        return card_id in self._pos
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def rebuild(self, card_ids):
+        self._ids = array("q", card_ids)
+        self._pos = {card_id: i for i, card_id in enumerate(self._ids)}
+
+    def add(self, card_id: int):
+        if card_id in self._pos:
+            return
+        self._pos[card_id] = len(self._ids)
+        self._ids.append(card_id)
+
+    def extend(self, card_ids):
+        for card_id in card_ids:
+            self.add(card_id)
+
+    def discard(self, card_id: int):
+        i = self._pos.pop(card_id, None)
+        if i is None:
+            return
+        last = self._ids.pop()
+        if last != card_id:
+            self._ids[i] = last
+            self._pos[last] = i
+
+    def pick(self) -> Optional[int]:
+        if not self._ids:
+            return None
+        return self._ids[random.randrange(len(self._ids))]
+
+    def stale_slots(self) -> int:
+        """slots whose card_id -> slot entry disagrees with the array."""
+        stale = sum(1 for i, card_id in enumerate(self._ids) if self._pos.get(card_id) != i)
+        return stale + abs(len(self._pos) - len(self._ids))
+
+def parse_rarity_rates(spec: str) -> Dict[int, float]:
+    rates = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        rarity, weight = part.split(":")
+        rates[int(rarity)] = float(weight)
+    if not rates or any(w < 0 for w in rates.values()) or not sum(rates.values()):
+        raise ValueError(f"bad RARITY_RATES: {spec!r}")
+    return rates
+
+class AliasTable:
+    """
+    Walker's alias method (Vose's construction): O(n) to build, then a
+    weighted pick is one random slot plus one coin flip, O(1).
+    """
+
+    def __init__(self, keys: List, weights: List[float]):
+        n = len(keys)
+        total = sum(weights)
+        self._keys = list(keys)
+        self._prob = [1.0] * n
+        self._alias = list(range(n))
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self._prob[s] = scaled[s]
+            self._alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # leftovers are 1.0 up to float error
+
+    def pick(self):
+        i = random.randrange(len(self._keys))
+        if random.random() >= self._prob[i]:
+            i = self._alias[i]
+        return self._keys[i]
+
+class RollPool:
+    """
+    Rarity-weighted roll pool. Cards sit in one RollIndex bucket per
+    (rarity, on banner); a roll picks a bucket from an alias table, then a
+    uniform card inside it. Adding a card is O(1) on its bucket and only
+    marks the alias table dirty; it is rebuilt over the handful of buckets
+    (not the catalog) on the next roll.
+
+    The buckets hold the whole shared catalog. What each guild has claimed
+    is a set per guild plus per-bucket counts: a guild's alias table weighs
+    buckets by what is still unclaimed there. Inside a bucket a guild that
+    has claimed less than half of it rejection-samples (under 2 tries
+    expected); past that it gets its own swap-remove RollIndex of the
+    unclaimed ids, built on first use and kept current by claim/release,
+    so a pick stays O(1) however much the guild owns. A free list is only
+    built once it would be at most half its bucket.
+    """
+
+    def __init__(self, rates: Dict[int, float], banner_series=(), banner_boost: float = 1.0):
+        self.rates = dict(rates)
+        self.banner_series = frozenset(banner_series)
+        self.banner_boost = banner_boost
+        self._buckets: Dict[Tuple[int, bool], RollIndex] = {}
+        self._where: Dict[int, Tuple[int, bool]] = {}
+        self._alias: Optional[AliasTable] = None
+        self._dirty = True
+        self._claimed: Dict[int, set] = {}                 # guild_id -> card_ids
+        self._claimed_per_bucket: Dict[int, Counter] = {}  # guild_id -> bucket -> count
+        self._guild_alias: Dict[int, Optional[AliasTable]] = {}
+        self._free: Dict[int, Dict[Tuple[int, bool], RollIndex]] = {}  # guild_id -> bucket -> unclaimed
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def available(self, guild_id: Optional[int] = None) -> int:
+        """cards that can still come up in this guild."""
+        return len(self._where) - len(self._claimed.get(guild_id, ()))
+
+    def _touch(self):
+        # bucket sizes changed: every alias table is stale
+        self._dirty = True
+        self._guild_alias.clear()
+
+    def __contains__(self, card_id: int) -> bool:
+        return card_id in self._where
+
+    def _key(self, rarity: int, series: str) -> Tuple[int, bool]:
+        # rarities outside the table roll with the nearest configured one
+        rarity = min(max(rarity, min(self.rates)), max(self.rates))
+        return (rarity, series in self.banner_series)
+
+    def rebuild(self, cards):
+        """cards: (card_id, rarity, series) rows."""
+        self._buckets = {}
+        self._where = {}
+        for card_id, rarity, series in cards:
+            self.add(card_id, rarity, series)
+        # cards may have changed bucket: recount the claims against the new layout
+        self.rebuild_claims([
+            (guild_id, card_id) for guild_id, ids in self._claimed.items() for card_id in ids
+        ])
+        self._touch()
+
+    def add(self, card_id: int, rarity: int, series: str):
+        if card_id in self._where:
+            return
+        key = self._key(rarity, series)
+        self._buckets.setdefault(key, RollIndex()).add(card_id)
+        self._where[card_id] = key
+        for free in self._free.values():
+            if key in free:
+                free[key].add(card_id)
+        self._touch()
+
+    def extend(self, cards):
+        for card_id, rarity, series in cards:
+            self.add(card_id, rarity, series)
+
+    def discard(self, card_id: int):
+        """take a card out of the catalog (and out of every guild's claims)."""
+        key = self._where.get(card_id)
+        if key is None:
+            return
+        for guild_id in list(self._claimed):
+            self.release(guild_id, card_id)
+        for free in self._free.values():
+            if key in free:
+                free[key].discard(card_id)
+        del self._where[card_id]
+        self._buckets[key].discard(card_id)
+        self._touch()
+
+    def rebuild_claims(self, claims):
+        """claims: (guild_id, card_id) rows."""
+        self._claimed = {}
+        self._claimed_per_bucket = {}
+        self._free = {}
+        self._guild_alias.clear()
+        for guild_id, card_id in claims:
+            self.claim(guild_id, card_id)
+
+    def claim(self, guild_id: int, card_id: int):
+        key = self._where.get(card_id)
+        claimed = self._claimed.setdefault(guild_id, set())
+        if key is None or card_id in claimed:
+            return
+        claimed.add(card_id)
+        self._claimed_per_bucket.setdefault(guild_id, Counter())[key] += 1
+        free = self._free.get(guild_id, {}).get(key)
+        if free is not None:
+            free.discard(card_id)
+        self._guild_alias.pop(guild_id, None)
+
+    def release(self, guild_id: int, card_id: int):
+        claimed = self._claimed.get(guild_id)
+        if not claimed or card_id not in claimed:
+            return
+        key = self._where[card_id]
+        claimed.discard(card_id)
+        self._claimed_per_bucket[guild_id][key] -= 1
+        free = self._free.get(guild_id, {}).get(key)
+        if free is not None:
+            free.add(card_id)
+        self._guild_alias.pop(guild_id, None)
+
+    def bucket_weights(self, guild_id: Optional[int] = None) -> Dict[Tuple[int, bool], float]:
+        """probability of each non-empty bucket on one roll (in this guild)."""
+        claimed = self._claimed_per_bucket.get(guild_id) or Counter()
+
+        def size(key: Tuple[int, bool]) -> int:
+            return len(self._buckets.get(key, ())) - claimed[key]
+
+        weights = {}
+        for rarity, rate in self.rates.items():
+            plain = size((rarity, False))
+            boosted = size((rarity, True)) * self.banner_boost
+            if rate <= 0 or not plain + boosted:
+                continue
+            if plain:
+                weights[(rarity, False)] = rate * plain / (plain + boosted)
+            if boosted:
+                weights[(rarity, True)] = rate * boosted / (plain + boosted)
+        total = sum(weights.values())
+        return {key: w / total for key, w in weights.items()} if total else {}
+
+    def rarity_rates(self, guild_id: Optional[int] = None) -> Dict[int, float]:
+        """effective chance of each rarity per roll, given which buckets are empty."""
+        rates: Dict[int, float] = {}
+        for (rarity, _), w in self.bucket_weights(guild_id).items():
+            rates[rarity] = rates.get(rarity, 0.0) + w
+        return rates
+
+    @staticmethod
+    def _alias_table(weights: Dict) -> Optional[AliasTable]:
+        return AliasTable(list(weights), list(weights.values())) if weights else None
+
+    def _table(self, guild_id: Optional[int] = None) -> Optional[AliasTable]:
+        if self._claimed.get(guild_id):
+            if guild_id not in self._guild_alias:
+                self._guild_alias[guild_id] = self._alias_table(self.bucket_weights(guild_id))
+            return self._guild_alias[guild_id]
+        if self._dirty:
+            self._alias = self._alias_table(self.bucket_weights())
+            self._dirty = False
+        return self._alias
+
+    def pick(self, guild_id: Optional[int] = None) -> Optional[int]:
+        """one weighted card, skipping what guild_id has claimed (None: any card)."""
+        table = self._table(guild_id)
+        if table is None:
+            return None
+        key = table.pick()
+        claimed = self._claimed.get(guild_id)
+        if not claimed:
+            return self._buckets[key].pick()
+        return self._pick_unclaimed(guild_id, key, claimed)
+
+    def _pick_unclaimed(self, guild_id: int, key: Tuple[int, bool], claimed: set) -> Optional[int]:
+        free = self._free.get(guild_id, {}).get(key)
+        if free is not None:
+            return free.pick()
+        bucket = self._buckets[key]
+        if self._claimed_per_bucket[guild_id][key] * 2 < len(bucket):
+            # mostly free: each try hits with p > 1/2
+            for _ in range(32):
+                card_id = bucket.pick()
+                if card_id not in claimed:
+                    return card_id
+        free = RollIndex()
+        free.rebuild(card_id for card_id in bucket if card_id not in claimed)
+        self._free.setdefault(guild_id, {})[key] = free
+        return free.pick()
+
+    def sample(self, k: int, guild_id: Optional[int] = None) -> List[int]:
+        """k distinct weighted picks (fewer if the pool runs dry)."""
+        k = min(k, self.available(guild_id))
+        picked: List[int] = []
+        seen = set()
+        for _ in range(k * 20):
+            if len(picked) == k:
+                break
+            card_id = self.pick(guild_id)
+            if card_id is None:
+                break
+            if card_id not in seen:
+                seen.add(card_id)
+                picked.append(card_id)
+        return picked
+
+    def drift(self, cards) -> Tuple[int, int]:
+        """(cards missing or in the wrong bucket, cards that shouldn't be here) vs. cards rows."""
+        expected = {card_id: self._key(rarity, series) for card_id, rarity, series in cards}
+        missing = sum(1 for card_id, key in expected.items() if self._where.get(card_id) != key)
+        extra = sum(1 for card_id in self._where if card_id not in expected)
+        extra += sum(bucket.stale_slots() for bucket in self._buckets.values())
+        return missing, extra
+
+    def claims_drift(self, claims) -> int:
+        """claims that differ from (guild_id, card_id) rows, either way."""
+        expected = {(guild_id, card_id) for guild_id, card_id in claims if card_id in self._where}
+        held = {(guild_id, card_id) for guild_id, ids in self._claimed.items() for card_id in ids}
+        return len(expected ^ held)
+
+roll_pool = RollPool(parse_rarity_rates(RARITY_RATES), BANNER_SERIES, BANNER_BOOST)
+
+# ==================== CLAIM WINDOWS ====================
+
+class RollWindowStore:
+    """
+    Latest unclaimed roll per (channel_id, roller_id), so $claim is a dict
+    lookup instead of walking channel history.
+
+    Expiry runs off one min-heap of deadlines: purge() pops whatever is due
+    and is called on every access plus a periodic sweep, so idle channels
+    don't hold rolls forever. A newer roll by the same user replaces the
+    older one; its stale heap entry is skipped when it comes due.
+
+    This is the in-process backend; SQLiteRollWindowStore has the same
+    async interface. Nothing here actually awaits.
+    """
+
+    def __init__(self, window_seconds: int):
+        self.window_seconds = window_seconds
+        self._rolls: Dict[Tuple[int, int], Dict] = {}
+        self._deadlines: List[Tuple[float, Tuple[int, int]]] = []
+        self.evicted = 0
+        self.claimed = 0
+
+    def __len__(self) -> int:
+        return len(self._rolls)
+
+    async def put(self, channel_id: int, roller_id: int, roll: Dict):
+        key = (channel_id, roller_id)
+        expires_at = time.monotonic() + self.window_seconds
+        self._rolls[key] = dict(roll, expires_at=expires_at)
+        heapq.heappush(self._deadlines, (expires_at, key))
+        self._purge()
+
+    async def get(self, channel_id: int, roller_id: int) -> Optional[Dict]:
+        self._purge()
+        return self._rolls.get((channel_id, roller_id))
+
+    async def pop(self, channel_id: int, roller_id: int,
+                  message_id: Optional[int] = None) -> Optional[Dict]:
+        """
+        take the roll out so it can't be claimed twice. With message_id,
+        only if it is still that roll: a $w sent while a claim was in
+        flight replaced it and stays open.
+        """
+        self._purge()
+        key = (channel_id, roller_id)
+        roll = self._rolls.get(key)
+        if roll is None or (message_id is not None and roll["message_id"] != message_id):
+            return None
+        del self._rolls[key]
+        self.claimed += 1
+        return roll
+
+    async def purge(self) -> int:
+        return self._purge()
+
+    def _purge(self) -> int:
+        now = time.monotonic()
+        evicted = 0
+        while self._deadlines and self._deadlines[0][0] <= now:
+            expires_at, key = heapq.heappop(self._deadlines)
+            roll = self._rolls.get(key)
+            if roll is not None and roll["expires_at"] == expires_at:
+                del self._rolls[key]
+                evicted += 1
+        self.evicted += evicted
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._rolls),
+            "deadlines": len(self._deadlines),
+            "evicted": self.evicted,
+            "claimed": self.claimed,
+        }
+
+class SQLiteRollWindowStore:
+    """
+    Claim windows in the roll_windows table. Every bot process pointed at
+    the same db file (one process per shard, or a bot that just restarted)
+    sees the same open rolls, so $claim works whichever process served $w.
+
+    Deadlines are wall-clock epoch seconds, since monotonic clocks aren't
+    shared between processes. Reads filter out expired rows and the
+    periodic purge() deletes them. stats() stays synchronous for the metrics
+    scrape: size is as of the last purge, and the counters are this
+    process's own.
+    """
+
+    def __init__(self, window_seconds: int):
+        self.window_seconds = window_seconds
+        self.size = 0
+        self.evicted = 0
+        self.claimed = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    async def put(self, channel_id: int, roller_id: int, roll: Dict):
+        await put_roll_window(
+            channel_id, roller_id, roll["card_ids"], roll["message_id"],
+            time.time() + self.window_seconds,
+        )
+
+    async def get(self, channel_id: int, roller_id: int) -> Optional[Dict]:
+        return await get_roll_window(channel_id, roller_id, time.time())
+
+    async def pop(self, channel_id: int, roller_id: int,
+                  message_id: Optional[int] = None) -> Optional[Dict]:
+        """delete and return in one statement, so only one claimer gets it (see RollWindowStore.pop)."""
+        roll = await pop_roll_window(channel_id, roller_id, time.time(), message_id)
+        if roll is not None:
+            self.claimed += 1
+        return roll
+
+    async def purge(self) -> int:
+        evicted, self.size = await purge_roll_windows(time.time())
+        self.evicted += evicted
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": self.size,
+            "deadlines": self.size,
+            "evicted": self.evicted,
+            "claimed": self.claimed,
+        }
+
+def make_roll_window_store(backend: str, window_seconds: int):
+    if backend == "memory":
+        return RollWindowStore(window_seconds)
+    if backend == "sqlite":
+        return SQLiteRollWindowStore(window_seconds)
+    raise ValueError(f"bad ROLL_WINDOW_BACKEND: {backend!r} (memory or sqlite)")
+
+# ==================== USER CACHE ====================
+
+USER_COLUMNS = """
+    user_id, cash, daily_time, last_roll_batch, rolls_left,
+    last_claim, last_vote, vote_count, is_admin
+"""
+
+class UserRecord:
+    """One users row. Cooldown timestamps are epoch seconds (or None)."""
+
+    __slots__ = (
+        "user_id", "cash", "daily_time", "last_roll_batch", "rolls_left",
+        "last_claim", "last_vote", "vote_count", "is_admin",
+    )
+
+    def __init__(self, row):
+        (self.user_id, self.cash, self.daily_time, self.last_roll_batch, self.rolls_left,
+         self.last_claim, self.last_vote, self.vote_count, self.is_admin) = row
+
+class UserCache:
+    """
+    Bounded LRU of UserRecords. Write-through: every user mutation returns
+    the updated row and the cache stores it, so reads never go stale
+    within this process.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._users: "OrderedDict[int, UserRecord]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def get(self, user_id: int) -> Optional[UserRecord]:
+        user = self._users.get(user_id)
+        if user is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._users.move_to_end(user_id)
+        return user
+
+    def put(self, user: UserRecord, replace: bool = True) -> UserRecord:
+        """
+        replace=False is for read-fills: if a write landed while the SELECT
+        was in flight, the written record is newer, so keep it.
+        """
+        if self.max_size <= 0:
+            return user
+        if not replace and user.user_id in self._users:
+            return self._users[user.user_id]
+        self._users[user.user_id] = user
+        self._users.move_to_end(user.user_id)
+        while len(self._users) > self.max_size:
+            self._users.popitem(last=False)
+        return user
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._users),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+user_cache = UserCache(USER_CACHE_SIZE)
+
+def _remember_user(row) -> Optional[UserRecord]:
+    return user_cache.put(UserRecord(row)) if row else None
+
+# ==================== LEADERBOARD ====================
+
+class LeaderboardCache:
+    """
+    Top-N rows per (guild, metric), served from memory. A claim invalidates
+    its guild; the TTL covers changes that don't go through a claim (a sync
+    moving card values). A miss is one LIMIT N walk down a user_stats index.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[Tuple[int, str], Tuple[float, List[Tuple]]] = {}
+
+    def get(self, guild_id: int, metric: str) -> Optional[List[Tuple]]:
+        entry = self._entries.get((guild_id, metric))
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            return None
+        return entry[1]
+
+    def put(self, guild_id: int, metric: str, rows: List[Tuple]):
+        self._entries[(guild_id, metric)] = (time.monotonic(), rows)
+
+    def invalidate(self, guild_id: Optional[int] = None):
+        """drop one guild's entries, or everything."""
+        if guild_id is None:
+            self._entries.clear()
+            return
+        for key in [key for key in self._entries if key[0] == guild_id]:
+            del self._entries[key]
+
+leaderboard_cache = LeaderboardCache(LEADERBOARD_TTL_SECONDS)
+
+# ==================== WISHLIST ====================
+
+class WishIndex:
+    """
+    Inverted wishlist: card_id -> user_ids who wished for it. Loaded once
+    from the wishes table and kept in step with it, so a roll finds who to
+    ping with a dict lookup instead of a query.
+    """
+
+    def __init__(self):
+        self._by_card: Dict[int, set] = {}
+
+    def __len__(self) -> int:
+        return sum(len(users) for users in self._by_card.values())
+
+    def rebuild(self, wishes):
+        """wishes: (user_id, card_id) rows."""
+        self._by_card = {}
+        for user_id, card_id in wishes:
+            self.add(user_id, card_id)
+
+    def add(self, user_id: int, card_id: int):
+        self._by_card.setdefault(card_id, set()).add(user_id)
+
+    def discard(self, user_id: int, card_id: int):
+        users = self._by_card.get(card_id)
+        if users is None:
+            return
+        users.discard(user_id)
+        if not users:
+            del self._by_card[card_id]
+
+    def wishers(self, card_id: int) -> frozenset:
+        return frozenset(self._by_card.get(card_id, ()))
+
+wish_index = WishIndex()
+
+# ==================== COOLDOWNS ====================
+
+class Cooldowns(NamedTuple):
+    """Epoch second each cooldown is ready at (<= now means ready now)."""
+    daily: int
+    claim: int
+    vote: int
+    rolls: int
+    rolls_left: int             # rolls usable right now
+
+def _ready_at(last: Optional[int], cooldown_seconds: int) -> int:
+    return last + cooldown_seconds if last is not None else 0
+
+def cooldowns(user: UserRecord, now: int) -> Cooldowns:
+    """
+    Every cooldown for a user in one pass, straight off the cached record.
+    Roll batches are lazy: an expired batch simply counts as full, and the
+    reset only gets written when the next roll is actually spent.
+    """
+    batch_expired = _ready_at(user.last_roll_batch, ROLL_RESET_SECONDS) <= now
+    rolls_left = ROLL_LIMIT if batch_expired else user.rolls_left
+    return Cooldowns(
+        daily=_ready_at(user.daily_time, DAILY_COOLDOWN_SECONDS),
+        claim=_ready_at(user.last_claim, CLAIM_COOLDOWN_SECONDS),
+        vote=_ready_at(user.last_vote, VOTE_RESET_SECONDS),
+        rolls=0 if rolls_left > 0 else _ready_at(user.last_roll_batch, ROLL_RESET_SECONDS),
+        rolls_left=rolls_left,
+    )
+
+# ==================== SCHEMA MIGRATIONS ====================
+
+# (version, step) pairs; each step runs once, in version order, and is
+# recorded in schema_version. Never edit a shipped step: add a new one.
+MIGRATIONS: List[Tuple[int, Callable]] = []
+
+def migration(version: int):
+    def register(func):
+        MIGRATIONS.append((version, func))
+        return func
+    return register
+
+@migration(1)
+def _m001_base_tables(cursor):
+    # IF NOT EXISTS: databases from before schema_version already have these
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS users (
             user_id INTEGER PRIMARY KEY,
@@ -128,32 +1368,611 @@ def setup_db(cursor):
         )
     """)
 
-@with_db
-def get_user(cursor, user_id: int):
+@migration(2)
+def _m002_hot_query_indexes(cursor):
+    # older $addcard runs could insert the same name+series twice; fold the
+    # duplicates so the unique index can be built. A copy never moves to
+    # another player: each owner's copies fold into their lowest card_id,
+    # unowned copies into the group's first owned card (or its first card),
+    # and an owner left with a second row of the group keeps it, renamed
+    # "<name> (#<card_id>)".
+    cursor.execute("""
+        CREATE TEMP TABLE card_dupes AS
+        SELECT c.card_id AS dupe_id, g.primary_id,
+               CASE WHEN c.owner_id IS NULL THEN g.primary_id
+                    ELSE (SELECT MIN(o.card_id) FROM cards o
+                          WHERE o.name = c.name AND o.series = c.series
+                            AND o.owner_id = c.owner_id)
+               END AS keep_id
+        FROM cards c
+        JOIN (
+            SELECT name, series,
+                   COALESCE(MIN(CASE WHEN owner_id IS NOT NULL THEN card_id END),
+                            MIN(card_id)) AS primary_id
+            FROM cards
+            WHERE name IS NOT NULL AND series IS NOT NULL
+            GROUP BY name, series
+            HAVING COUNT(*) > 1
+        ) g ON c.name = g.name AND c.series = g.series
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO inventory (user_id, card_id)
+        SELECT i.user_id, d.keep_id
+        FROM inventory i
+        JOIN card_dupes d ON i.card_id = d.dupe_id
+        WHERE d.dupe_id <> d.keep_id
+    """)
+    cursor.execute("""
+        DELETE FROM inventory
+        WHERE card_id IN (SELECT dupe_id FROM card_dupes WHERE dupe_id <> keep_id)
+    """)
+    cursor.execute("""
+        DELETE FROM cards
+        WHERE card_id IN (SELECT dupe_id FROM card_dupes WHERE dupe_id <> keep_id)
+    """)
+    cursor.execute("""
+        UPDATE cards
+        SET name = name || ' (#' || card_id || ')'
+        WHERE card_id IN (SELECT keep_id FROM card_dupes WHERE keep_id <> primary_id)
+    """)
+    if cursor.rowcount:
+        print(f"Renamed {cursor.rowcount} duplicate card(s) owned by different players.")
+    cursor.execute("DROP TABLE card_dupes")
+
+    # character_exists / $populate dedupe
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_cards_name_series
+        ON cards (name, series)
+    """)
+    # owner lookups, and $inventory ordering straight off the index: the
+    # owner_id prefix serves plain owner lookups too
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_cards_owner_rank
+        ON cards (owner_id, rarity DESC, value DESC, card_id DESC)
+    """)
+
+@migration(3)
+def _m003_anilist_sync(cursor):
+    # anilist_id is filled in for older rows the first time $sync sees them
+    cursor.execute("ALTER TABLE cards ADD COLUMN anilist_id INTEGER")
+    cursor.execute("ALTER TABLE cards ADD COLUMN favourites INTEGER")
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_cards_anilist_id
+        ON cards (anilist_id)
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            name            TEXT PRIMARY KEY,
+            last_page       INTEGER,
+            last_anilist_id INTEGER,
+            synced_at       TEXT
+        )
+    """)
+
+@migration(4)
+def _m004_epoch_cooldowns(cursor):
+    # ISO-8601 TEXT -> INTEGER epoch seconds. SQLite can't retype a column
+    # in place, so rebuild the table and convert on the copy.
     cursor.execute("""
-        SELECT user_id, cash, daily_time, last_roll_batch, rolls_left,
-               last_claim, last_vote, vote_count, is_admin
+        CREATE TABLE users_new (
+            user_id INTEGER PRIMARY KEY,
+            cash INTEGER DEFAULT 1000,
+            daily_time INTEGER,
+            last_roll_batch INTEGER,
+            rolls_left INTEGER DEFAULT 10,
+            last_claim INTEGER,
+            last_vote INTEGER,
+            vote_count INTEGER DEFAULT 0,
+            is_admin INTEGER DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO users_new (
+            user_id, cash, daily_time, last_roll_batch, rolls_left,
+            last_claim, last_vote, vote_count, is_admin
+        )
+        SELECT user_id, cash,
+               CAST(strftime('%s', daily_time) AS INTEGER),
+               CAST(strftime('%s', last_roll_batch) AS INTEGER),
+               rolls_left,
+               CAST(strftime('%s', last_claim) AS INTEGER),
+               CAST(strftime('%s', last_vote) AS INTEGER),
+               vote_count, is_admin
+        FROM users
+    """)
+    cursor.execute("DROP TABLE users")
+    cursor.execute("ALTER TABLE users_new RENAME TO users")
+
+def _stats_delta_sql(sign: str, user: str, rarity: str, value: str, when: str) -> str:
+    """
+    Trigger statements that add (sign "+") or remove (sign "-") one card
+    from `user`'s user_stats row, if `when` holds (the card is owned).
+    """
+    bucket = f"MIN(MAX({rarity}, 1), 5)"
+    per_rarity = ",\n".join(
+        f"rarity_{r} = rarity_{r} {sign} ({bucket} = {r})" for r in range(1, 6)
+    )
+    return f"""
+        INSERT OR IGNORE INTO user_stats (user_id)
+        SELECT {user} WHERE {when};
+        UPDATE user_stats
+        SET card_count = card_count {sign} 1,
+            total_value = total_value {sign} {value},
+            {per_rarity}
+        WHERE user_id = {user} AND {when};
+    """
+
+@migration(5)
+def _m005_user_stats(cursor):
+    # per-user collection totals, kept current by triggers so the inventory
+    # footer and $leaderboard never GROUP BY over inventory x cards.
+    # A card counts for a user while cards.owner_id is them AND they have the
+    # inventory row (same rule as _INVENTORY_OWNED).
+    cursor.execute("""
+        CREATE TABLE user_stats (
+            user_id     INTEGER PRIMARY KEY,
+            card_count  INTEGER NOT NULL DEFAULT 0,
+            total_value INTEGER NOT NULL DEFAULT 0,
+            rarity_1    INTEGER NOT NULL DEFAULT 0,
+            rarity_2    INTEGER NOT NULL DEFAULT 0,
+            rarity_3    INTEGER NOT NULL DEFAULT 0,
+            rarity_4    INTEGER NOT NULL DEFAULT 0,
+            rarity_5    INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("CREATE INDEX idx_user_stats_cards ON user_stats(card_count DESC, user_id)")
+    cursor.execute("CREATE INDEX idx_user_stats_value ON user_stats(total_value DESC, user_id)")
+
+    def owned(row: str) -> str:
+        return (f"{row}.owner_id IS NOT NULL AND EXISTS (SELECT 1 FROM inventory "
+                f"WHERE user_id = {row}.owner_id AND card_id = {row}.card_id)")
+
+    # ownership, rarity or value changed: take the old card out, put the new one in
+    cursor.execute(f"""
+        CREATE TRIGGER trg_cards_stats_update
+        AFTER UPDATE OF owner_id, rarity, value ON cards
+        BEGIN
+            {_stats_delta_sql("-", "OLD.owner_id", "OLD.rarity", "OLD.value", owned("OLD"))}
+            {_stats_delta_sql("+", "NEW.owner_id", "NEW.rarity", "NEW.value", owned("NEW"))}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER trg_cards_stats_delete
+        AFTER DELETE ON cards
+        BEGIN
+            {_stats_delta_sql("-", "OLD.owner_id", "OLD.rarity", "OLD.value", owned("OLD"))}
+        END
+    """)
+    # an inventory row only counts while the card's owner_id points at it
+    for event, row, sign in (("INSERT", "NEW", "+"), ("DELETE", "OLD", "-")):
+        card = f"(SELECT {{}} FROM cards WHERE card_id = {row}.card_id)"
+        when = (f"EXISTS (SELECT 1 FROM cards WHERE card_id = {row}.card_id "
+                f"AND owner_id = {row}.user_id)")
+        cursor.execute(f"""
+            CREATE TRIGGER trg_inventory_stats_{event.lower()}
+            AFTER {event} ON inventory
+            BEGIN
+                {_stats_delta_sql(sign, f"{row}.user_id", card.format("rarity"), card.format("value"), when)}
+            END
+        """)
+
+    # one-shot backfill for existing collections
+    cursor.execute(f"""
+        INSERT INTO user_stats (
+            user_id, card_count, total_value,
+            rarity_1, rarity_2, rarity_3, rarity_4, rarity_5
+        )
+        SELECT c.owner_id, COUNT(*), SUM(c.value),
+               {", ".join(f"SUM(MIN(MAX(c.rarity, 1), 5) = {r})" for r in range(1, 6))}
+        FROM cards c
+        JOIN inventory i ON i.user_id = c.owner_id AND i.card_id = c.card_id
+        GROUP BY c.owner_id
+    """)
+
+@migration(6)
+def _m006_card_search(cursor):
+    # the native name (e.g. 碇シンジ) was fetched from AniList but dropped;
+    # keep it so $search can match it. Older rows fill in on the next $sync.
+    cursor.execute("ALTER TABLE cards ADD COLUMN name_native TEXT")
+    # two external-content indexes over cards (no second copy of the text):
+    # word tokens with prefix indexes for ranked "asu*" style matching, and
+    # trigrams for substring / partial matches, which also covers CJK names
+    # that unicode61 would keep as one long token
+    cursor.execute("""
+        CREATE VIRTUAL TABLE cards_fts USING fts5(
+            name, series, name_native,
+            content='cards', content_rowid='card_id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    """)
+    cursor.execute("""
+        CREATE VIRTUAL TABLE cards_fts_tri USING fts5(
+            name, series, name_native,
+            content='cards', content_rowid='card_id',
+            tokenize='trigram'
+        )
+    """)
+    for fts in ("cards_fts", "cards_fts_tri"):
+        cursor.execute(f"""
+            CREATE TRIGGER trg_{fts}_insert AFTER INSERT ON cards
+            BEGIN
+                INSERT INTO {fts} (rowid, name, series, name_native)
+                VALUES (NEW.card_id, NEW.name, NEW.series, NEW.name_native);
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER trg_{fts}_delete AFTER DELETE ON cards
+            BEGIN
+                INSERT INTO {fts} ({fts}, rowid, name, series, name_native)
+                VALUES ('delete', OLD.card_id, OLD.name, OLD.series, OLD.name_native);
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER trg_{fts}_update AFTER UPDATE OF name, series, name_native ON cards
+            BEGIN
+                INSERT INTO {fts} ({fts}, rowid, name, series, name_native)
+                VALUES ('delete', OLD.card_id, OLD.name, OLD.series, OLD.name_native);
+                INSERT INTO {fts} (rowid, name, series, name_native)
+                VALUES (NEW.card_id, NEW.name, NEW.series, NEW.name_native);
+            END
+        """)
+        cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+        # a name hit outranks a series hit
+        cursor.execute(f"INSERT INTO {fts} ({fts}, rank) VALUES ('rank', 'bm25(10.0, 2.0, 10.0)')")
+
+@migration(7)
+def _m007_wishes(cursor):
+    cursor.execute("""
+        CREATE TABLE wishes (
+            user_id INTEGER NOT NULL,
+            card_id INTEGER NOT NULL,
+            PRIMARY KEY (user_id, card_id)
+        ) WITHOUT ROWID
+    """)
+
+@migration(8)
+def _m008_series_table(cursor):
+    # every card repeated its full romaji series title; intern the titles
+    # into series and keep only the integer id on cards
+    cursor.execute("""
+        CREATE TABLE series (
+            series_id INTEGER PRIMARY KEY,
+            title     TEXT NOT NULL UNIQUE
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO series (title)
+        SELECT DISTINCT COALESCE(series, 'Unknown Series') FROM cards ORDER BY 1
+    """)
+    cursor.execute("ALTER TABLE cards ADD COLUMN series_id INTEGER REFERENCES series (series_id)")
+    cursor.execute("""
+        UPDATE cards
+        SET series_id = (
+            SELECT series_id FROM series
+            WHERE title = COALESCE(cards.series, 'Unknown Series')
+        )
+    """)
+
+    # everything that still reads cards.series has to go before the column
+    # can: the name+series unique index and the search indexes/triggers
+    cursor.execute("DROP INDEX idx_cards_name_series")
+    for fts in ("cards_fts", "cards_fts_tri"):
+        for event in ("insert", "delete", "update"):
+            cursor.execute(f"DROP TRIGGER trg_{fts}_{event}")
+        cursor.execute(f"DROP TABLE {fts}")
+    cursor.execute("ALTER TABLE cards DROP COLUMN series")
+
+    cursor.execute("CREATE UNIQUE INDEX idx_cards_name_series ON cards (name, series_id)")
+    # $series: one series' cards, best first
+    cursor.execute("CREATE INDEX idx_cards_series ON cards (series_id, rarity DESC, value DESC)")
+
+    # the search indexes again, now reading the title through a view
+    cursor.execute("""
+        CREATE VIEW cards_search AS
+        SELECT c.card_id, c.name, s.title AS series, c.name_native
+        FROM cards c
+        JOIN series s ON s.series_id = c.series_id
+    """)
+    cursor.execute("""
+        CREATE VIRTUAL TABLE cards_fts USING fts5(
+            name, series, name_native,
+            content='cards_search', content_rowid='card_id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    """)
+    cursor.execute("""
+        CREATE VIRTUAL TABLE cards_fts_tri USING fts5(
+            name, series, name_native,
+            content='cards_search', content_rowid='card_id',
+            tokenize='trigram'
+        )
+    """)
+    title = "(SELECT title FROM series WHERE series_id = {}.series_id)"
+    for fts in ("cards_fts", "cards_fts_tri"):
+        cursor.execute(f"""
+            CREATE TRIGGER trg_{fts}_insert AFTER INSERT ON cards
+            BEGIN
+                INSERT INTO {fts} (rowid, name, series, name_native)
+                VALUES (NEW.card_id, NEW.name, {title.format("NEW")}, NEW.name_native);
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER trg_{fts}_delete AFTER DELETE ON cards
+            BEGIN
+                INSERT INTO {fts} ({fts}, rowid, name, series, name_native)
+                VALUES ('delete', OLD.card_id, OLD.name, {title.format("OLD")}, OLD.name_native);
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER trg_{fts}_update AFTER UPDATE OF name, series_id, name_native ON cards
+            BEGIN
+                INSERT INTO {fts} ({fts}, rowid, name, series, name_native)
+                VALUES ('delete', OLD.card_id, OLD.name, {title.format("OLD")}, OLD.name_native);
+                INSERT INTO {fts} (rowid, name, series, name_native)
+                VALUES (NEW.card_id, NEW.name, {title.format("NEW")}, NEW.name_native);
+            END
+        """)
+        cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {fts} ({fts}, rank) VALUES ('rank', 'bm25(10.0, 2.0, 10.0)')")
+
+@migration(9)
+def _m009_roll_windows(cursor):
+    # backs ROLL_WINDOW_BACKEND=sqlite; harmless and empty otherwise
+    cursor.execute("""
+        CREATE TABLE roll_windows (
+            channel_id INTEGER NOT NULL,
+            roller_id  INTEGER NOT NULL,
+            card_ids   TEXT NOT NULL,       -- JSON list, in display order
+            message_id INTEGER,
+            expires_at REAL NOT NULL,       -- epoch seconds
+            PRIMARY KEY (channel_id, roller_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX idx_roll_windows_expires ON roll_windows(expires_at)")
+
+def _claim_stats_sql(sign: str, row: str) -> str:
+    """
+    Trigger statements that add (sign "+") or remove (sign "-") claims row
+    `row` (NEW / OLD) from its owner's user_stats in that guild.
+    """
+    bucket = f"MIN(MAX({row}.rarity, 1), 5)"
+    per_rarity = ",\n".join(
+        f"rarity_{r} = rarity_{r} {sign} ({bucket} = {r})" for r in range(1, 6)
+    )
+    # not INSERT OR IGNORE: the claim upsert's own conflict policy (ABORT)
+    # would override it inside the trigger
+    return f"""
+        INSERT INTO user_stats (guild_id, user_id)
+        SELECT {row}.guild_id, {row}.user_id
+        WHERE NOT EXISTS (
+            SELECT 1 FROM user_stats
+            WHERE guild_id = {row}.guild_id AND user_id = {row}.user_id
+        );
+        UPDATE user_stats
+        SET card_count = card_count {sign} 1,
+            total_value = total_value {sign} {row}.value,
+            {per_rarity}
+        WHERE guild_id = {row}.guild_id AND user_id = {row}.user_id;
+    """
+
+@migration(10)
+def _m010_guild_claims(cursor):
+    # ownership moves off the shared catalog: a card can be claimed once per
+    # guild. WITHOUT ROWID clusters each guild's claims together on disk.
+    # rarity / value are copies of the card's, kept by trigger, so $inventory
+    # pages straight off idx_claims_inventory without touching cards
+    cursor.execute("""
+        CREATE TABLE claims (
+            guild_id INTEGER NOT NULL,
+            card_id  INTEGER NOT NULL REFERENCES cards (card_id),
+            user_id  INTEGER NOT NULL,
+            rarity   INTEGER NOT NULL,
+            value    INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, card_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE INDEX idx_claims_inventory
+        ON claims (guild_id, user_id, rarity DESC, value DESC, card_id DESC)
+    """)
+    # catalog-side changes fan out to every guild's copy
+    cursor.execute("CREATE INDEX idx_claims_card ON claims (card_id)")
+
+    # existing collections, by the old ownership rule (cards.owner_id agrees
+    # with an inventory row), go to the home guild; with no GUILD_ID they sit
+    # in guild 0 until the bot finds out which server it is in
+    cursor.execute("""
+        INSERT INTO claims (guild_id, card_id, user_id, rarity, value)
+        SELECT ?, c.card_id, c.owner_id, COALESCE(c.rarity, 1), COALESCE(c.value, 0)
+        FROM cards c
+        JOIN inventory i ON i.user_id = c.owner_id AND i.card_id = c.card_id
+    """, (GUILD_ID,))
+
+    for trigger in ("trg_cards_stats_update", "trg_cards_stats_delete",
+                    "trg_inventory_stats_insert", "trg_inventory_stats_delete"):
+        cursor.execute(f"DROP TRIGGER {trigger}")
+    cursor.execute("DROP INDEX idx_cards_owner_rank")
+    cursor.execute("DROP TABLE inventory")
+    cursor.execute("ALTER TABLE cards DROP COLUMN owner_id")
+
+    # collection totals are per guild now
+    cursor.execute("DROP TABLE user_stats")
+    cursor.execute("""
+        CREATE TABLE user_stats (
+            guild_id    INTEGER NOT NULL,
+            user_id     INTEGER NOT NULL,
+            card_count  INTEGER NOT NULL DEFAULT 0,
+            total_value INTEGER NOT NULL DEFAULT 0,
+            rarity_1    INTEGER NOT NULL DEFAULT 0,
+            rarity_2    INTEGER NOT NULL DEFAULT 0,
+            rarity_3    INTEGER NOT NULL DEFAULT 0,
+            rarity_4    INTEGER NOT NULL DEFAULT 0,
+            rarity_5    INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, user_id)
+        )
+    """)
+    cursor.execute("CREATE INDEX idx_user_stats_cards ON user_stats (guild_id, card_count DESC, user_id)")
+    cursor.execute("CREATE INDEX idx_user_stats_value ON user_stats (guild_id, total_value DESC, user_id)")
+
+    cursor.execute(f"""
+        CREATE TRIGGER trg_claims_stats_insert AFTER INSERT ON claims
+        BEGIN
+            {_claim_stats_sql("+", "NEW")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER trg_claims_stats_delete AFTER DELETE ON claims
+        BEGIN
+            {_claim_stats_sql("-", "OLD")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER trg_claims_stats_update
+        AFTER UPDATE OF guild_id, user_id, rarity, value ON claims
+        BEGIN
+            {_claim_stats_sql("-", "OLD")}
+            {_claim_stats_sql("+", "NEW")}
+        END
+    """)
+    # a sync moving a card's rarity / value reaches every guild's claim
+    cursor.execute("""
+        CREATE TRIGGER trg_cards_claims_update
+        AFTER UPDATE OF rarity, value ON cards
+        BEGIN
+            UPDATE claims
+            SET rarity = COALESCE(NEW.rarity, 1), value = COALESCE(NEW.value, 0)
+            WHERE card_id = NEW.card_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER trg_cards_claims_delete AFTER DELETE ON cards
+        BEGIN
+            DELETE FROM claims WHERE card_id = OLD.card_id;
+        END
+    """)
+
+    cursor.execute(f"""
+        INSERT INTO user_stats (
+            guild_id, user_id, card_count, total_value,
+            rarity_1, rarity_2, rarity_3, rarity_4, rarity_5
+        )
+        SELECT guild_id, user_id, COUNT(*), SUM(value),
+               {", ".join(f"SUM(MIN(MAX(rarity, 1), 5) = {r})" for r in range(1, 6))}
+        FROM claims
+        GROUP BY guild_id, user_id
+    """)
+
+@migration(11)
+def _m011_bulk_search_index(cursor):
+    # FTS5 flushes its pending terms at every statement savepoint, so the
+    # per-row insert triggers write a tiny segment per card: ~150ms per
+    # 50-row import page. Bulk imports put a row in search_index_paused for
+    # the length of their transaction and index the whole page with one
+    # INSERT ... SELECT instead; single inserts and outside writers still go
+    # through the triggers.
+    cursor.execute("""
+        CREATE TABLE search_index_paused (
+            paused INTEGER PRIMARY KEY CHECK (paused = 1)
+        )
+    """)
+    title = "(SELECT title FROM series WHERE series_id = NEW.series_id)"
+    for fts in ("cards_fts", "cards_fts_tri"):
+        cursor.execute(f"DROP TRIGGER trg_{fts}_insert")
+        cursor.execute(f"""
+            CREATE TRIGGER trg_{fts}_insert AFTER INSERT ON cards
+            WHEN NOT EXISTS (SELECT 1 FROM search_index_paused)
+            BEGIN
+                INSERT INTO {fts} (rowid, name, series, name_native)
+                VALUES (NEW.card_id, NEW.name, {title}, NEW.name_native);
+            END
+        """)
+
+@migration(12)
+def _m012_series_title_nocase(cursor):
+    # find_series matches titles case-insensitively, which the BINARY unique
+    # index on series.title can't serve
+    cursor.execute("CREATE INDEX idx_series_title_nocase ON series (title COLLATE NOCASE)")
+
+@migration(13)
+def _m013_search_vocab(cursor):
+    # the distinct words of cards_fts, for search_cards' typo-tolerant stage
+    cursor.execute("CREATE VIRTUAL TABLE cards_fts_vocab USING fts5vocab(cards_fts, 'row')")
+
+@migration(14)
+def _m014_search_words(cursor):
+    # scanning cards_fts_vocab for near words grew with the vocabulary. A
+    # symmetric-deletion index instead: every catalog word under each of its
+    # one-letter deletions, so a typo's candidates are a handful of primary
+    # key probes. Filled in by _index_search_words (setup_db backfills it).
+    cursor.execute("""
+        CREATE TABLE search_word_variants (
+            variant TEXT NOT NULL,
+            word    TEXT NOT NULL,
+            PRIMARY KEY (variant, word)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE search_words_indexed (
+            id           INTEGER PRIMARY KEY CHECK (id = 1),
+            last_card_id INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("INSERT INTO search_words_indexed (id, last_card_id) VALUES (1, 0)")
+
+@migration(15)
+def _m015_wishes_by_card(cursor):
+    # wishers of a rolled card, for rolls that skip the in-memory WishIndex
+    cursor.execute("CREATE INDEX idx_wishes_card ON wishes (card_id, user_id)")
+
+# ==================== DB SETUP / QUERIES ====================
+
+@writes_db
+def setup_db(cursor):
+    """
+    Bring the schema up to date. Every pending migration runs inside one
+    transaction, so a failed step leaves the existing file untouched.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version    INTEGER PRIMARY KEY,
+            applied_at TEXT
+        )
+    """)
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    current = cursor.fetchone()[0]
+
+    applied = 0
+    for version, step in sorted(MIGRATIONS):
+        if version <= current:
+            continue
+        step(cursor)
+        cursor.execute(
+            "INSERT INTO schema_version (version, applied_at) VALUES (?, ?)",
+            (version, dt_to_str(now_utc())),
+        )
+        print(f"Applied schema migration {version} ({step.__name__}).")
+        applied += 1
+
+    # picks up cards written while the bot was down (or by other tools)
+    _index_search_words(cursor)
+
+    # refresh planner stats so the new indexes actually get picked
+    if applied:
+        cursor.execute("ANALYZE")
+
+@reads_db
+def _select_user(cursor, user_id: int):
+    cursor.execute(f"""
+        SELECT {USER_COLUMNS}
         FROM users
         WHERE user_id = ?
     """, (user_id,))
-    row = cursor.fetchone()
-
-    if row:
-        return {
-            "user_id": row[0],
-            "cash": row[1],
-            "daily_time": row[2],
-            "last_roll_batch": row[3],
-            "rolls_left": row[4],
-            "last_claim": row[5],
-            "last_vote": row[6],
-            "vote_count": row[7],
-            "is_admin": row[8],
-        }
+    return cursor.fetchone()
 
-    # create default row if missing
+def _ensure_user(cursor, user_id: int):
+    # OR IGNORE: two first-time commands from one user can race here
     cursor.execute("""
-        INSERT INTO users (
+        INSERT OR IGNORE INTO users (
             user_id, cash, daily_time,
             last_roll_batch, rolls_left,
             last_claim, last_vote,
@@ -162,123 +1981,478 @@ def get_user(cursor, user_id: int):
         VALUES (?, 1000, NULL, NULL, ?, NULL, NULL, 0, 0)
     """, (user_id, ROLL_LIMIT))
 
-    return {
-        "user_id": user_id,
-        "cash": 1000,
-        "daily_time": None,
-        "last_roll_batch": None,
-        "rolls_left": ROLL_LIMIT,
-        "last_claim": None,
-        "last_vote": None,
-        "vote_count": 0,
-        "is_admin": 0,
-    }
+def _fetch_user_row(cursor, user_id: int):
+    cursor.execute(f"SELECT {USER_COLUMNS} FROM users WHERE user_id = ?", (user_id,))
+    return cursor.fetchone()
 
-@with_db
-def set_daily_time(cursor, user_id: int, when_iso: str):
-    cursor.execute("""
-        UPDATE users
-        SET daily_time = ?
-        WHERE user_id = ?
-    """, (when_iso, user_id))
+@writes_db
+def _create_user(cursor, user_id: int):
+    _ensure_user(cursor, user_id)
+    return _fetch_user_row(cursor, user_id)
 
-@with_db
-def add_cash(cursor, user_id: int, delta: int):
-    cursor.execute("""
+async def get_user(user_id: int) -> UserRecord:
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    row = await _select_user(user_id)
+    if row:
+        return user_cache.put(UserRecord(row), replace=False)
+
+    # create default row if missing
+    return _remember_user(await _create_user(user_id))
+
+@writes_db
+def _claim_daily(cursor, user_id: int, reward: int, now: int):
+    """
+    Daily cooldown check, cash reward and timestamp as one conditional
+    UPDATE, so concurrent $daily calls (or another shard) can't pay out
+    twice. Returns (rewarded, user row).
+    """
+    _ensure_user(cursor, user_id)
+    cursor.execute(f"""
         UPDATE users
-        SET cash = cash + ?
+        SET cash = cash + ?,
+            daily_time = ?
         WHERE user_id = ?
-    """, (delta, user_id))
-    cursor.execute("SELECT cash FROM users WHERE user_id = ?", (user_id,))
+          AND (daily_time IS NULL OR daily_time <= ?)
+        RETURNING {USER_COLUMNS}
+    """, (reward, now, user_id, now - DAILY_COOLDOWN_SECONDS))
     row = cursor.fetchone()
-    return row[0] if row else None
+    if not row:
+        return False, _fetch_user_row(cursor, user_id)
+    return True, row
 
-@with_db
-def grant_new_roll_batch(cursor, user_id: int, when_iso: str, roll_limit: int):
-    cursor.execute("""
+async def claim_daily(user_id: int, reward: int, now: int) -> Tuple[bool, UserRecord]:
+    rewarded, row = await _claim_daily(user_id, reward, now)
+    return rewarded, _remember_user(row)
+
+@writes_db
+def _consume_rolls(cursor, guild_id: int, user_id: int, card_ids: List[int], now: int):
+    """
+    Roll the first of `card_ids` the user still has rolls for, spending one
+    roll per card actually found, in one transaction. A fresh batch starts
+    first if the last one is ROLL_RESET_SECONDS old. The availability check
+    and the UPDATE share the writer's lock, so concurrent $w calls can't
+    both spend the same roll. Returns (cards, user row).
+    """
+    _ensure_user(cursor, user_id)
+    user = UserRecord(_fetch_user_row(cursor, user_id))
+    available = cooldowns(user, now).rolls_left
+    cards = _cards_by_ids(cursor, guild_id, card_ids[:max(0, available)])
+    granted = len(cards)
+    if granted <= 0:
+        # out of rolls (or cards): hand back the row so the caller can say when the batch resets
+        return [], _fetch_user_row(cursor, user_id)
+
+    batch_started = user.last_roll_batch
+    if _ready_at(batch_started, ROLL_RESET_SECONDS) <= now:
+        batch_started = now
+    cursor.execute(f"""
         UPDATE users
         SET rolls_left = ?,
             last_roll_batch = ?
         WHERE user_id = ?
-    """, (roll_limit, when_iso, user_id))
+        RETURNING {USER_COLUMNS}
+    """, (available - granted, batch_started, user_id))
+    return cards, cursor.fetchone()
 
-@with_db
-def set_rolls_left(cursor, user_id: int, new_left: int):
-    cursor.execute("""
-        UPDATE users
-        SET rolls_left = ?
-        WHERE user_id = ?
-    """, (new_left, user_id))
+async def consume_rolls(guild_id: int, user_id: int, count: int,
+                        now: int) -> Tuple[List[Dict], UserRecord]:
+    """up to `count` distinct random cards unclaimed in this guild, one roll spent per card."""
+    card_ids = roll_pool.sample(count, guild_id)
+    cards, row = await _consume_rolls(guild_id, user_id, card_ids, now)
+    return cards, _remember_user(row)
 
-@with_db
-def set_last_claim(cursor, user_id: int, when_iso: str):
-    cursor.execute("""
+@writes_db
+def _claim_card(cursor, guild_id: int, user_id: int, card_id: int, reward: int, now: int) -> Dict:
+    """
+    Cooldown check, cash reward, claim timestamp and ownership change (in
+    this guild only) in one transaction. Nothing is written if the claim
+    cooldown hasn't passed.
+    """
+    _ensure_user(cursor, user_id)
+    if not ROLL_OWNED_CARDS:
+        # someone else here may have claimed the same card since it was rolled
+        cursor.execute(
+            "SELECT user_id FROM claims WHERE guild_id = ? AND card_id = ?", (guild_id, card_id)
+        )
+        owner = cursor.fetchone()
+        if owner and owner[0] != user_id:
+            return {"claimed": False, "taken": True, "user": _fetch_user_row(cursor, user_id)}
+
+    cursor.execute(f"""
         UPDATE users
-        SET last_claim = ?
+        SET cash = cash + ?,
+            last_claim = ?
         WHERE user_id = ?
-    """, (when_iso, user_id))
+          AND (last_claim IS NULL OR last_claim <= ?)
+        RETURNING {USER_COLUMNS}
+    """, (reward, now, user_id, now - CLAIM_COOLDOWN_SECONDS))
+    user_row = cursor.fetchone()
+    if not user_row:
+        return {"claimed": False, "user": _fetch_user_row(cursor, user_id)}
 
-@with_db
-def record_vote_and_reset_rolls(cursor, user_id: int, when_iso: str, roll_limit: int):
+    # with ROLL_OWNED_CARDS a claim can move a card between users
     cursor.execute("""
+        INSERT INTO claims (guild_id, card_id, user_id, rarity, value)
+        SELECT ?, card_id, ?, COALESCE(rarity, 1), COALESCE(value, 0)
+        FROM cards WHERE card_id = ?
+        ON CONFLICT (guild_id, card_id) DO UPDATE SET user_id = excluded.user_id
+    """, (guild_id, user_id, card_id))
+    cursor.execute("SELECT name FROM cards WHERE card_id = ?", (card_id,))
+    row = cursor.fetchone()
+    # a wish is fulfilled once you own the card
+    cursor.execute("DELETE FROM wishes WHERE user_id = ? AND card_id = ?", (user_id, card_id))
+
+    return {
+        "claimed": True,
+        "user": user_row,
+        "name": row[0] if row else None,
+    }
+
+async def claim_card(guild_id: int, user_id: int, card_id: int, reward: int, now: int) -> Dict:
+    result = await _claim_card(guild_id, user_id, card_id, reward, now)
+    result["user"] = _remember_user(result["user"])
+    if result["claimed"]:
+        leaderboard_cache.invalidate(guild_id)
+        wish_index.discard(user_id, card_id)
+        if not ROLL_OWNED_CARDS:
+            roll_pool.claim(guild_id, card_id)
+    return result
+
+@writes_db
+def _move_guild_claims(cursor, from_guild: int, to_guild: int) -> int:
+    """move every claim from one guild to another that has none yet."""
+    cursor.execute("SELECT 1 FROM claims WHERE guild_id = ? LIMIT 1", (to_guild,))
+    if cursor.fetchone():
+        return 0
+    cursor.execute("UPDATE claims SET guild_id = ? WHERE guild_id = ?", (to_guild, from_guild))
+    return cursor.rowcount
+
+async def adopt_unassigned_claims(guild_id: int) -> int:
+    """
+    Collections migrated without GUILD_ID set sit in guild 0; hand them to
+    the one server the bot is in.
+    """
+    moved = await _move_guild_claims(0, guild_id)
+    if moved:
+        leaderboard_cache.invalidate()
+        if not ROLL_OWNED_CARDS:
+            roll_pool.rebuild_claims(await get_all_claims())
+    return moved
+
+@writes_db
+def _record_vote_and_reset_rolls(cursor, user_id: int, when_ts: int, roll_limit: int):
+    """
+    Vote cooldown check and roll reset as one conditional UPDATE (same
+    reasoning as _claim_daily). Returns (reset, user row).
+    """
+    _ensure_user(cursor, user_id)
+    cursor.execute(f"""
         UPDATE users
         SET vote_count = vote_count + 1,
             last_vote = ?,
             rolls_left = ?,
             last_roll_batch = ?
         WHERE user_id = ?
-    """, (when_iso, roll_limit, when_iso, user_id))
+          AND (last_vote IS NULL OR last_vote <= ?)
+        RETURNING {USER_COLUMNS}
+    """, (when_ts, roll_limit, when_ts, user_id, when_ts - VOTE_RESET_SECONDS))
+    row = cursor.fetchone()
+    if not row:
+        return False, _fetch_user_row(cursor, user_id)
+    return True, row
+
+async def record_vote_and_reset_rolls(user_id: int, when_ts: int,
+                                      roll_limit: int) -> Tuple[bool, UserRecord]:
+    reset, row = await _record_vote_and_reset_rolls(user_id, when_ts, roll_limit)
+    return reset, _remember_user(row)
+
+# card reads select the series title through this join; rows are shaped
+# for _card_row_to_dict. The owner is per guild: queries using
+# _CARDS_WITH_OWNER take a :guild_id parameter
+_CARD_COLUMNS = "c.card_id, c.name, s.title, c.age, c.image_url, c.rarity, c.value, cl.user_id"
+_CARDS_WITH_SERIES = "cards c JOIN series s ON s.series_id = c.series_id"
+_OWNER_JOIN = "LEFT JOIN claims cl ON cl.guild_id = :guild_id AND cl.card_id = c.card_id"
+_CARDS_WITH_OWNER = f"{_CARDS_WITH_SERIES} {_OWNER_JOIN}"
+
+# series title -> series_id. Only grows, and only after the row is committed.
+series_ids: Dict[str, int] = {}
+
+@reads_db
+def get_all_series(cursor) -> List[Tuple]:
+    cursor.execute("SELECT title, series_id FROM series")
+    return cursor.fetchall()
+
+async def load_series():
+    series_ids.clear()
+    series_ids.update(await get_all_series())
 
-@with_db
+@writes_db
+def _intern_series(cursor, titles: List[str]) -> Dict[str, int]:
+    cursor.executemany("INSERT OR IGNORE INTO series (title) VALUES (?)", [(t,) for t in titles])
+    marks = ",".join("?" * len(titles))
+    cursor.execute(f"SELECT title, series_id FROM series WHERE title IN ({marks})", titles)
+    return dict(cursor.fetchall())
+
+async def resolve_series(titles) -> Dict[str, int]:
+    """series_ids with every title in `titles` present, interning new ones."""
+    missing = sorted({t for t in titles if t not in series_ids})
+    if missing:
+        series_ids.update(await _intern_series(missing))
+    return series_ids
+
+@reads_db
 def character_exists(cursor, name: str, series: str) -> Optional[int]:
-    cursor.execute("""
-        SELECT card_id FROM cards
-        WHERE name = ? AND series = ?
+    cursor.execute(f"""
+        SELECT c.card_id FROM {_CARDS_WITH_SERIES}
+        WHERE c.name = ? AND s.title = ?
         LIMIT 1
     """, (name, series))
     row = cursor.fetchone()
     return row[0] if row else None
 
-@with_db
-def insert_card(cursor, name: str, series: str, age: str,
-                image_url: str, rarity: int, value: int):
+@writes_db
+def _insert_card_row(cursor, name: str, series_id: int, age: str,
+                     image_url: str, rarity: int, value: int):
     cursor.execute("""
-        INSERT INTO cards (name, series, age, image_url, rarity, value, owner_id)
-        VALUES (?, ?, ?, ?, ?, ?, NULL)
-    """, (name, series, age, image_url, rarity, value))
-    return cursor.lastrowid
+        INSERT INTO cards (name, series_id, age, image_url, rarity, value)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (name, series_id, age, image_url, rarity, value))
+    card_id = cursor.lastrowid
+    _index_search_words(cursor)
+    return card_id
 
-@with_db
-def get_random_card(cursor):
-    cursor.execute("""
-        SELECT card_id, name, series, age, image_url, rarity, value
-        FROM cards
-        ORDER BY RANDOM()
-        LIMIT 1
-    """)
-    row = cursor.fetchone()
-    if not row:
-        return None
+async def insert_card(name: str, series: str, age: str,
+                      image_url: str, rarity: int, value: int) -> int:
+    ids = await resolve_series([series])
+    card_id = await _insert_card_row(name, ids[series], age, image_url, rarity, value)
+    roll_pool.add(card_id, rarity, series)
+    return card_id
+
+def _pause_search_index(cursor):
+    """stop the per-row search triggers until _index_new_cards, in this transaction only."""
+    cursor.execute("INSERT OR IGNORE INTO search_index_paused (paused) VALUES (1)")
+
+def _index_new_cards(cursor, after_card_id: int):
+    """add every card past after_card_id to both search indexes, then resume the triggers."""
+    for fts in ("cards_fts", "cards_fts_tri"):
+        cursor.execute(f"""
+            INSERT INTO {fts} (rowid, name, series, name_native)
+            SELECT card_id, name, series, name_native
+            FROM cards_search
+            WHERE card_id > ?
+        """, (after_card_id,))
+    cursor.execute("DELETE FROM search_index_paused")
+    _index_search_words(cursor)
+
+def _catalog_words(text: Optional[str]) -> set:
+    """the words cards_fts sees in text (unicode61, diacritics folded) that the typo index keeps."""
+    if not text:
+        return set()
+    folded = "".join(
+        ch for ch in unicodedata.normalize("NFKD", text.lower())
+        if not unicodedata.combining(ch)
+    )
     return {
-        "card_id": row[0],
-        "name": row[1],
-        "series": row[2],
-        "age": row[3],
-        "image_url": row[4],
-        "rarity": row[5],
-        "value": row[6],
+        word for word in re.findall(r"[^\W_]+", folded)
+        if SEARCH_FUZZY_MIN_LENGTH - 1 <= len(word) <= SEARCH_WORD_MAX_LENGTH
     }
 
-@with_db
-def get_card_by_id(cursor, card_id: int):
+def _word_variants(word: str, deletions: int) -> set:
+    """word and every string left after removing up to `deletions` of its letters."""
+    variants = level = {word}
+    for _ in range(deletions):
+        level = {w[:i] + w[i + 1:] for w in level for i in range(len(w))}
+        variants = variants | level
+    return variants
+
+def _index_search_words(cursor) -> int:
+    """
+    Add the words of every card past search_words_indexed to
+    search_word_variants. Words only ever get added: a word whose cards are
+    gone just finds nothing in cards_fts.
+    """
+    cursor.execute("SELECT last_card_id FROM search_words_indexed")
+    last = cursor.fetchone()[0]
+    cursor.execute("""
+        SELECT card_id, name, series, name_native FROM cards_search
+        WHERE card_id > ?
+    """, (last,))
+    texts = set()
+    for card_id, *card_texts in cursor.fetchall():
+        last = max(last, card_id)
+        texts.update(card_texts)
+    words = set().union(*map(_catalog_words, texts))
+    # key order keeps a big backfill appending to the b-tree, not splitting it
+    cursor.executemany(
+        "INSERT OR IGNORE INTO search_word_variants (variant, word) VALUES (?, ?)",
+        sorted((variant, word) for word in words for variant in _word_variants(word, 1)),
+    )
+    cursor.execute("UPDATE search_words_indexed SET last_card_id = ?", (last,))
+    return len(words)
+
+@writes_db
+def _insert_card_rows(cursor, rows: List[Tuple]) -> List[Tuple]:
+    """bulk insert in one transaction; returns (card_id, rarity, series) of the new rows."""
+    cursor.execute("SELECT COALESCE(MAX(card_id), 0) FROM cards")
+    before = cursor.fetchone()[0]
+    _pause_search_index(cursor)
+    cursor.executemany("""
+        INSERT OR IGNORE INTO cards (
+            name, series_id, age, image_url, rarity, value,
+            anilist_id, favourites, name_native
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    _index_new_cards(cursor, before)
+    # AUTOINCREMENT ids only grow, and this is the only writer
+    cursor.execute(f"""
+        SELECT c.card_id, c.rarity, s.title FROM {_CARDS_WITH_SERIES}
+        WHERE c.card_id > ?
+    """, (before,))
+    return cursor.fetchall()
+
+async def insert_cards(cards: List[Dict]) -> List[int]:
+    ids = await resolve_series(c["series"] for c in cards)
+    rows = [
+        (c["name"], ids[c["series"]], c["age"], c["image_url"], c["rarity"], c["value"],
+         c.get("anilist_id"), c.get("favourites"), c.get("name_native"))
+        for c in cards
+    ]
+    new_cards = await _insert_card_rows(rows)
+    roll_pool.extend(new_cards)
+    return [card[0] for card in new_cards]
+
+@reads_db
+def get_sync_state(cursor, name: str) -> Optional[Dict]:
     cursor.execute("""
-        SELECT card_id, name, series, age, image_url, rarity, value, owner_id
-        FROM cards
-        WHERE card_id = ?
-    """, (card_id,))
+        SELECT last_page, last_anilist_id, synced_at
+        FROM sync_state
+        WHERE name = ?
+    """, (name,))
     row = cursor.fetchone()
     if not row:
         return None
+    return {"last_page": row[0], "last_anilist_id": row[1], "synced_at": row[2]}
+
+@writes_db
+def _sync_card_rows(cursor, rows: List[Dict], checkpoint: Optional[Dict]) -> Dict:
+    """
+    Upsert one AniList page by anilist_id and, in the same transaction, move
+    the sync cursor, so a crash resumes from the last page that committed.
+    Existing rows only change when favourites, the image or the native name
+    actually moved.
+    """
+    cursor.execute("SELECT COALESCE(MAX(card_id), 0) FROM cards")
+    max_before = cursor.fetchone()[0]
+    _pause_search_index(cursor)
+
+    # rows from before anilist_id existed: adopt them by name+series
+    cursor.executemany("""
+        UPDATE cards
+        SET anilist_id = :anilist_id
+        WHERE anilist_id IS NULL AND name = :name AND series_id = :series_id
+          AND NOT EXISTS (SELECT 1 FROM cards WHERE anilist_id = :anilist_id)
+    """, rows)
+    cursor.executemany("""
+        INSERT OR IGNORE INTO cards (
+            name, series_id, age, image_url, rarity, value,
+            anilist_id, favourites, name_native
+        )
+        VALUES (:name, :series_id, :age, :image_url, :rarity, :value,
+                :anilist_id, :favourites, :name_native)
+        ON CONFLICT (anilist_id) DO UPDATE
+        SET favourites  = excluded.favourites,
+            rarity      = excluded.rarity,
+            value       = excluded.value,
+            image_url   = excluded.image_url,
+            name_native = excluded.name_native
+        WHERE cards.favourites IS NOT excluded.favourites
+           OR cards.image_url IS NOT excluded.image_url
+           OR cards.name_native IS NOT excluded.name_native
+    """, rows)
+    # rows inserted or updated by the upsert itself; unlike total_changes this
+    # leaves out the search/stats trigger writes. Adopted rows count here too:
+    # their favourites were just filled in.
+    touched = cursor.rowcount
+    _index_new_cards(cursor, max_before)
+
+    cursor.execute(f"""
+        SELECT c.card_id, c.rarity, s.title FROM {_CARDS_WITH_SERIES}
+        WHERE c.card_id > ?
+    """, (max_before,))
+    new_cards = cursor.fetchall()
+    new_ids = [card[0] for card in new_cards]
+
+    if checkpoint:
+        cursor.execute("""
+            INSERT INTO sync_state (name, last_page, last_anilist_id, synced_at)
+            VALUES (:name, :last_page, :last_anilist_id, :synced_at)
+            ON CONFLICT (name) DO UPDATE
+            SET last_page       = excluded.last_page,
+                last_anilist_id = MAX(COALESCE(last_anilist_id, 0), excluded.last_anilist_id),
+                synced_at       = excluded.synced_at
+        """, checkpoint)
+
+    return {
+        "new_ids": new_ids,
+        "new_cards": new_cards,
+        "updated": max(0, touched - len(new_ids)),
+    }
+
+async def sync_cards(cards: List[Dict], checkpoint: Optional[Dict] = None) -> Dict:
+    ids = await resolve_series(c["series"] for c in cards)
+    cards = [dict(c, series_id=ids[c["series"]]) for c in cards]
+    result = await _sync_card_rows(cards, checkpoint)
+    roll_pool.extend(result["new_cards"])
+    return result
+
+@reads_db
+def get_catalog_keys(cursor) -> set:
+    """every (name, series) already in the catalog, for import dedupe."""
+    cursor.execute(f"SELECT c.name, s.title FROM {_CARDS_WITH_SERIES}")
+    return set(cursor.fetchall())
+
+@reads_db
+def get_rollable_cards(cursor) -> List[Tuple]:
+    """(card_id, rarity, series) of the whole catalog; claims are skipped per guild at pick time."""
+    cursor.execute(f"SELECT c.card_id, c.rarity, s.title FROM {_CARDS_WITH_SERIES}")
+    return cursor.fetchall()
+
+@reads_db
+def get_all_claims(cursor) -> List[Tuple]:
+    cursor.execute("SELECT guild_id, card_id FROM claims")
+    return cursor.fetchall()
+
+async def load_roll_pool():
+    roll_pool.rebuild(await get_rollable_cards())
+    # with ROLL_OWNED_CARDS claimed cards keep rolling, so there is nothing to skip
+    roll_pool.rebuild_claims([] if ROLL_OWNED_CARDS else await get_all_claims())
+
+async def check_roll_pool() -> bool:
+    """
+    Compare the in-memory pool with the cards and claims tables and rebuild
+    it if they disagree (a claim or import written by something other than
+    this process). Returns True if the pool was already consistent.
+    """
+    cards = await get_rollable_cards()
+    missing, extra = roll_pool.drift(cards)
+    consistent = not missing and not extra
+    if not consistent:
+        print(f"Roll pool out of sync ({missing} missing, {extra} stale); rebuilding.")
+        roll_pool.rebuild(cards)
+    if not ROLL_OWNED_CARDS:
+        claims = await get_all_claims()
+        drift = roll_pool.claims_drift(claims)
+        if drift:
+            print(f"Roll pool claims out of sync ({drift} differ); reloading.")
+            roll_pool.rebuild_claims(claims)
+            consistent = False
+    return consistent
+
+def _card_row_to_dict(row) -> Dict:
     return {
         "card_id": row[0],
         "name": row[1],
@@ -290,136 +2464,839 @@ def get_card_by_id(cursor, card_id: int):
         "owner_id": row[7],
     }
 
-@with_db
-def add_card_to_inventory(cursor, user_id: int, card_id: int):
-    cursor.execute("""
-        UPDATE cards
-        SET owner_id = ?
-        WHERE card_id = ?
-    """, (user_id, card_id))
-    cursor.execute("""
-        INSERT OR IGNORE INTO inventory (user_id, card_id)
-        VALUES (?, ?)
-    """, (user_id, card_id))
+@reads_db
+def get_card_by_id(cursor, guild_id: int, card_id: int):
+    cursor.execute(f"""
+        SELECT {_CARD_COLUMNS}
+        FROM {_CARDS_WITH_OWNER}
+        WHERE c.card_id = :card_id
+    """, {"guild_id": guild_id, "card_id": card_id})
+    row = cursor.fetchone()
+    return _card_row_to_dict(row) if row else None
 
-@with_db
-def get_inventory(cursor, user_id: int):
-    cursor.execute("""
-        SELECT c.card_id, c.name, c.series, c.rarity, c.value
-        FROM cards c
-        JOIN inventory i ON c.card_id = i.card_id
-        WHERE i.user_id = ?
-        ORDER BY c.rarity DESC, c.value DESC
-    """, (user_id,))
-    rows = cursor.fetchall()
-    cards = []
-    for r in rows:
-        cards.append({
+@reads_db
+def get_cards_by_ids(cursor, guild_id: int, card_ids: List[int]) -> List[Dict]:
+    return _cards_by_ids(cursor, guild_id, card_ids)
+
+def _cards_by_ids(cursor, guild_id: int, card_ids: List[int]) -> List[Dict]:
+    """one query for many primary keys; result keeps the order of card_ids."""
+    if not card_ids:
+        return []
+    params = {"guild_id": guild_id}
+    params.update((f"id{i}", card_id) for i, card_id in enumerate(card_ids))
+    marks = ",".join(f":id{i}" for i in range(len(card_ids)))
+    cursor.execute(f"""
+        SELECT {_CARD_COLUMNS}
+        FROM {_CARDS_WITH_OWNER}
+        WHERE c.card_id IN ({marks})
+    """, params)
+    found = {row[0]: _card_row_to_dict(row) for row in cursor.fetchall()}
+    return [found[card_id] for card_id in card_ids if card_id in found]
+
+# inventory rows come straight off idx_claims_inventory, in display order;
+# cards is only visited for the page's names
+_INVENTORY_FROM = """
+    claims cl
+    JOIN cards c ON c.card_id = cl.card_id
+    JOIN series s ON s.series_id = c.series_id
+"""
+
+@reads_db
+def get_inventory_page(cursor, guild_id: int, user_id: int, after: Optional[Tuple] = None,
+                       before: Optional[Tuple] = None,
+                       limit: int = INVENTORY_PAGE_SIZE) -> List[Dict]:
+    """
+    One page of a collection in one guild by keyset on (rarity, value,
+    card_id), best first. `after` is the last key of the current page (next
+    page); `before` is its first key (previous page). Cost is per page, not
+    per collection.
+    """
+    params = {"guild_id": guild_id, "user_id": user_id, "limit": limit}
+    if before is not None:
+        params.update(zip(("rarity", "value", "card_id"), before))
+        cursor.execute(f"""
+            SELECT cl.card_id, c.name, s.title, cl.rarity, cl.value
+            FROM {_INVENTORY_FROM}
+            WHERE cl.guild_id = :guild_id AND cl.user_id = :user_id
+              AND (cl.rarity, cl.value, cl.card_id) > (:rarity, :value, :card_id)
+            ORDER BY cl.rarity ASC, cl.value ASC, cl.card_id ASC
+            LIMIT :limit
+        """, params)
+        rows = cursor.fetchall()[::-1]
+    else:
+        keyset = ""
+        if after is not None:
+            params.update(zip(("rarity", "value", "card_id"), after))
+            keyset = "AND (cl.rarity, cl.value, cl.card_id) < (:rarity, :value, :card_id)"
+        cursor.execute(f"""
+            SELECT cl.card_id, c.name, s.title, cl.rarity, cl.value
+            FROM {_INVENTORY_FROM}
+            WHERE cl.guild_id = :guild_id AND cl.user_id = :user_id
+              {keyset}
+            ORDER BY cl.rarity DESC, cl.value DESC, cl.card_id DESC
+            LIMIT :limit
+        """, params)
+        rows = cursor.fetchall()
+
+    return [
+        {
             "card_id": r[0],
             "name": r[1],
             "series": r[2],
             "rarity": r[3],
             "value": r[4],
-        })
-    return cards
+        }
+        for r in rows
+    ]
+
+@reads_db
+def get_inventory_summary(cursor, guild_id: int, user_id: int) -> Dict:
+    """collection totals in one guild from user_stats (kept current by triggers)."""
+    cursor.execute("""
+        SELECT card_count, total_value,
+               rarity_1, rarity_2, rarity_3, rarity_4, rarity_5
+        FROM user_stats
+        WHERE guild_id = ? AND user_id = ?
+    """, (guild_id, user_id))
+    row = cursor.fetchone() or (0,) * 7
+    return {
+        "card_count": row[0],
+        "total_value": row[1],
+        "by_rarity": {r: row[r + 1] for r in range(1, 6)},
+    }
+
+LEADERBOARD_METRICS = {
+    "cards": "card_count",
+    "value": "total_value",
+}
+
+@reads_db
+def _get_leaderboard(cursor, guild_id: int, metric: str, limit: int) -> List[Tuple]:
+    column = LEADERBOARD_METRICS[metric]
+    cursor.execute(f"""
+        SELECT user_id, card_count, total_value
+        FROM user_stats
+        WHERE guild_id = ? AND card_count > 0
+        ORDER BY {column} DESC, user_id
+        LIMIT ?
+    """, (guild_id, limit))
+    return cursor.fetchall()
+
+async def get_leaderboard(guild_id: int, metric: str) -> List[Tuple]:
+    """top LEADERBOARD_SIZE (user_id, card_count, total_value) rows by metric in one guild."""
+    rows = leaderboard_cache.get(guild_id, metric)
+    if rows is None:
+        rows = await _get_leaderboard(guild_id, metric, LEADERBOARD_SIZE)
+        leaderboard_cache.put(guild_id, metric, rows)
+    return rows
+
+def _search_terms(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """optimal string alignment distance (adjacent swaps count once), or limit + 1 past limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        row = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            row[j] = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                row[j] = min(row[j], prev2[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+        prev2, prev = prev, row
+    return prev[-1]
+
+def _fuzzy_match(cursor, terms: List[str]) -> Optional[str]:
+    """
+    cards_fts MATCH string with each word widened to the catalog words
+    within SEARCH_FUZZY_EDITS of it ("narto" -> naruto), or None if some
+    word has no near match. Words that prefix a catalog word are kept as
+    typed. For the rest, candidates come from search_word_variants: a word
+    one edit away shares a one-deletion variant with it; two edits away, one
+    of them on the typed side, shares a two-deletion one. At most
+    SEARCH_FUZZY_CANDIDATES of them get scored, however big the catalog.
+    """
+    groups = []
+    for term in terms:
+        if len(term) >= SEARCH_FUZZY_MIN_LENGTH:
+            cursor.execute(
+                "SELECT 1 FROM cards_fts_vocab WHERE term >= ? AND term < ? LIMIT 1",
+                (term, term + "\U0010ffff"),
+            )
+        if len(term) < SEARCH_FUZZY_MIN_LENGTH or cursor.fetchone():
+            # spelt right (it prefixes a catalog word): keep it as typed
+            groups.append(f'"{term}"*')
+            continue
+        limit = 1 if len(term) < 7 else SEARCH_FUZZY_EDITS
+        variants = list(_word_variants(term, limit))
+        cursor.execute(f"""
+            SELECT DISTINCT word FROM search_word_variants
+            WHERE variant IN ({", ".join("?" * len(variants))})
+            LIMIT ?
+        """, variants + [SEARCH_FUZZY_CANDIDATES])
+        near = sorted(
+            (distance, word)
+            for (word,) in cursor.fetchall()
+            if (distance := _edit_distance(term, word, limit)) <= limit
+        )[:SEARCH_FUZZY_TERMS]
+        if not near:
+            return None
+        groups.append("(" + " OR ".join(f'"{word}"' for _, word in near) + ")")
+    # FTS5 only ANDs bare phrases implicitly; groups need the keyword
+    return " AND ".join(groups)
+
+@reads_db
+def search_cards(cursor, guild_id: int, text: str, offset: int = 0,
+                 limit: int = SEARCH_PAGE_SIZE) -> Tuple[List[Dict], bool]:
+    """
+    Ranked catalog search over name, series and native name. Every word has
+    to match as a prefix ("asu lan" finds Asuka Langley); if nothing does,
+    fall back to trigram substring matching ("ngley"), then to words a typo
+    or two away ("narto" finds Naruto, see _fuzzy_match). Returns one page of
+    cards and whether there is another page after it. Only the first
+    SEARCH_MAX_CANDIDATES matches (by card_id) get ranked, so a one-letter
+    query costs the same on a 1M-card catalog as on a small one.
+    """
+    terms = _search_terms(text)
+    if not terms:
+        return [], False
+
+    def stages():
+        yield "cards_fts", " ".join(f'"{t}"*' for t in terms)
+        # trigram needs 3+ characters per term
+        long_terms = [t for t in terms if len(t) >= 3]
+        if long_terms:
+            yield "cards_fts_tri", " ".join(f'"{t}"' for t in long_terms)
+        # only looked up once both exact stages came back empty
+        fuzzy = _fuzzy_match(cursor, terms)
+        if fuzzy:
+            yield "cards_fts", fuzzy
+
+    for fts, match in stages():
+        cursor.execute(f"""
+            SELECT {_CARD_COLUMNS}
+            FROM (
+                SELECT rowid, rank FROM {fts}
+                WHERE {fts} MATCH :match
+                LIMIT :candidates
+            ) f
+            JOIN cards c ON c.card_id = f.rowid
+            JOIN series s ON s.series_id = c.series_id
+            {_OWNER_JOIN}
+            ORDER BY f.rank
+            LIMIT :limit OFFSET :offset
+        """, {"match": match, "candidates": SEARCH_MAX_CANDIDATES, "guild_id": guild_id,
+              "limit": limit + 1, "offset": offset})
+        rows = cursor.fetchall()
+        if rows:
+            return [_card_row_to_dict(row) for row in rows[:limit]], len(rows) > limit
+        if offset:
+            # past the last page, or was this page served by the fallback?
+            cursor.execute(f"SELECT 1 FROM {fts} WHERE {fts} MATCH ? LIMIT 1", (match,))
+            if cursor.fetchone():
+                return [], False
+    return [], False
+
+# ==================== CLAIM WINDOW QUERIES ====================
+
+def _roll_window_row_to_dict(row) -> Optional[Dict]:
+    if row is None:
+        return None
+    card_ids, message_id, expires_at = row
+    return {"card_ids": json.loads(card_ids), "message_id": message_id, "expires_at": expires_at}
+
+@writes_db
+def put_roll_window(cursor, channel_id: int, roller_id: int, card_ids: List[int],
+                    message_id: int, expires_at: float):
+    # a newer roll by the same user replaces the older one
+    cursor.execute("""
+        INSERT INTO roll_windows (channel_id, roller_id, card_ids, message_id, expires_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (channel_id, roller_id) DO UPDATE SET
+            card_ids = excluded.card_ids,
+            message_id = excluded.message_id,
+            expires_at = excluded.expires_at
+    """, (channel_id, roller_id, json.dumps(card_ids), message_id, expires_at))
+
+@reads_db
+def get_roll_window(cursor, channel_id: int, roller_id: int, now: float) -> Optional[Dict]:
+    cursor.execute("""
+        SELECT card_ids, message_id, expires_at FROM roll_windows
+        WHERE channel_id = ? AND roller_id = ? AND expires_at > ?
+    """, (channel_id, roller_id, now))
+    return _roll_window_row_to_dict(cursor.fetchone())
+
+@writes_db
+def pop_roll_window(cursor, channel_id: int, roller_id: int, now: float,
+                    message_id: Optional[int] = None) -> Optional[Dict]:
+    cursor.execute("""
+        DELETE FROM roll_windows
+        WHERE channel_id = :channel_id AND roller_id = :roller_id AND expires_at > :now
+          AND (:message_id IS NULL OR message_id = :message_id)
+        RETURNING card_ids, message_id, expires_at
+    """, {"channel_id": channel_id, "roller_id": roller_id, "now": now, "message_id": message_id})
+    return _roll_window_row_to_dict(cursor.fetchone())
 
-# create DB if first run
-setup_db()
+@writes_db
+def purge_roll_windows(cursor, now: float) -> Tuple[int, int]:
+    """(rows deleted, rows left)."""
+    cursor.execute("DELETE FROM roll_windows WHERE expires_at <= ?", (now,))
+    evicted = cursor.rowcount
+    cursor.execute("SELECT COUNT(*) FROM roll_windows")
+    return evicted, cursor.fetchone()[0]
+
+# ==================== SERIES QUERIES ====================
+
+@reads_db
+def find_series(cursor, text: str, limit: int = 5) -> List[Tuple]:
+    """
+    (series_id, title) matches: the exact title if there is one
+    (idx_series_title_nocase), else titles containing every word of text,
+    found through the series column of the trigram card index. Words
+    under 3 characters can't use trigrams and fall back to LIKE.
+    """
+    cursor.execute("SELECT series_id, title FROM series WHERE title = ? COLLATE NOCASE", (text,))
+    rows = cursor.fetchall()
+    if rows:
+        return rows
+    terms = _search_terms(text)
+    if terms and all(len(t) >= 3 for t in terms):
+        match = "series : (" + " ".join(f'"{t}"' for t in terms) + ")"
+        cursor.execute("""
+            SELECT series_id, title FROM series
+            WHERE series_id IN (
+                SELECT c.series_id
+                FROM (
+                    SELECT rowid FROM cards_fts_tri
+                    WHERE cards_fts_tri MATCH ?
+                    LIMIT ?
+                ) f
+                JOIN cards c ON c.card_id = f.rowid
+            )
+            ORDER BY length(title), title
+            LIMIT ?
+        """, (match, SEARCH_MAX_CANDIDATES, limit))
+        return cursor.fetchall()
+    pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    cursor.execute("""
+        SELECT series_id, title FROM series
+        WHERE title LIKE ? ESCAPE '\\'
+        ORDER BY length(title), title
+        LIMIT ?
+    """, (pattern, limit))
+    return cursor.fetchall()
+
+@reads_db
+def get_series_cards(cursor, guild_id: int, series_id: int) -> List[Dict]:
+    """every card of one series with its owner in this guild, best first (idx_cards_series)."""
+    cursor.execute(f"""
+        SELECT {_CARD_COLUMNS}
+        FROM {_CARDS_WITH_OWNER}
+        WHERE c.series_id = :series_id
+        ORDER BY c.rarity DESC, c.value DESC
+    """, {"guild_id": guild_id, "series_id": series_id})
+    return [_card_row_to_dict(row) for row in cursor.fetchall()]
+
+@reads_db
+def get_series_completion(cursor, guild_id: int, user_id: int, limit: int = 10) -> List[Tuple]:
+    """(title, owned, total) for the series a user collects most completely in one guild."""
+    cursor.execute(f"""
+        SELECT s.title, COUNT(*) AS owned,
+               (SELECT COUNT(*) FROM cards t WHERE t.series_id = c.series_id) AS total
+        FROM {_INVENTORY_FROM}
+        WHERE cl.guild_id = :guild_id AND cl.user_id = :user_id
+        GROUP BY c.series_id
+        ORDER BY owned * 1.0 / total DESC, owned DESC, s.title
+        LIMIT :limit
+    """, {"guild_id": guild_id, "user_id": user_id, "limit": limit})
+    return cursor.fetchall()
+
+# ==================== WISHLIST QUERIES ====================
+
+@reads_db
+def get_all_wishes(cursor) -> List[Tuple]:
+    cursor.execute("SELECT user_id, card_id FROM wishes")
+    return cursor.fetchall()
+
+async def load_wish_index():
+    if WISH_INDEX:
+        wish_index.rebuild(await get_all_wishes())
+
+@reads_db
+def get_wishers(cursor, card_ids: List[int]) -> Dict[int, frozenset]:
+    cursor.execute(f"""
+        SELECT card_id, user_id FROM wishes
+        WHERE card_id IN ({", ".join("?" * len(card_ids))})
+    """, card_ids)
+    wishers = {}
+    for card_id, user_id in cursor.fetchall():
+        wishers.setdefault(card_id, set()).add(user_id)
+    return {card_id: frozenset(users) for card_id, users in wishers.items()}
+
+async def wishers_of(card_ids: List[int]) -> Dict[int, frozenset]:
+    """card_id -> who wished for it, for the cards that have wishers."""
+    if not WISH_INDEX:
+        return await get_wishers(card_ids)
+    return {card_id: users for card_id in card_ids if (users := wish_index.wishers(card_id))}
+
+@writes_db
+def _add_wish(cursor, user_id: int, card_id: int) -> str:
+    """'added', 'exists' or 'full' (WISHLIST_MAX reached)."""
+    cursor.execute("SELECT 1 FROM wishes WHERE user_id = ? AND card_id = ?", (user_id, card_id))
+    if cursor.fetchone():
+        return "exists"
+    cursor.execute("SELECT COUNT(*) FROM wishes WHERE user_id = ?", (user_id,))
+    if cursor.fetchone()[0] >= WISHLIST_MAX:
+        return "full"
+    cursor.execute("INSERT INTO wishes (user_id, card_id) VALUES (?, ?)", (user_id, card_id))
+    return "added"
+
+async def add_wish(user_id: int, card_id: int) -> str:
+    status = await _add_wish(user_id, card_id)
+    if status == "added":
+        wish_index.add(user_id, card_id)
+    return status
+
+@writes_db
+def _remove_wish(cursor, user_id: int, card_id: int) -> bool:
+    cursor.execute("DELETE FROM wishes WHERE user_id = ? AND card_id = ?", (user_id, card_id))
+    return cursor.rowcount > 0
+
+async def remove_wish(user_id: int, card_id: int) -> bool:
+    removed = await _remove_wish(user_id, card_id)
+    if removed:
+        wish_index.discard(user_id, card_id)
+    return removed
+
+@reads_db
+def get_wishlist(cursor, guild_id: int, user_id: int) -> List[Dict]:
+    """a user's wishes, with who owns each one in this guild."""
+    cursor.execute(f"""
+        SELECT {_CARD_COLUMNS}
+        FROM wishes w
+        JOIN cards c ON c.card_id = w.card_id
+        JOIN series s ON s.series_id = c.series_id
+        {_OWNER_JOIN}
+        WHERE w.user_id = :user_id
+        ORDER BY c.rarity DESC, c.name
+    """, {"guild_id": guild_id, "user_id": user_id})
+    return [_card_row_to_dict(row) for row in cursor.fetchall()]
 
 # ==================== ANILIST FETCHER ====================
 
-class AniListAPI:
-    BASE_URL = "https://graphql.anilist.co"
+class AniListError(Exception):
+    pass
+
+def card_from_character(ch: Dict) -> Dict:
+    """AniList character -> cards row. Rarity/value come from favourites."""
+    favs = ch["favorites"]
+    rarity = min(5, max(1, favs // 1000))
+    return {
+        "anilist_id": ch.get("anilist_id"),
+        "favourites": favs,
+        "name": ch["name"],
+        "name_native": ch.get("name_native") or None,
+        "series": ch["series"],
+        "age": "unknown",
+        "image_url": ch["image_url"],
+        "rarity": rarity,
+        "value": max(100, rarity * 100 + favs // 10),
+    }
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of AniList GraphQL responses.
+
+    The key is a sha256 of the endpoint, the query text and its variables,
+    so a local fake AniList never answers for the real one. A file's mtime
+    is when it was stored (for the TTL) and its atime is bumped on every
+    hit, so eviction drops least-recently-used files once the directory
+    grows past max_bytes. Blocking file I/O runs in a worker thread.
+    """
+
+    def __init__(self, directory: str, ttl_seconds: float, max_bytes: int):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size: Optional[int] = None
+        # iter_pages keeps several puts in flight, each in its own thread
+        self._size_lock = threading.Lock()
 
     @staticmethod
-    async def fetch_characters(limit: int = 100) -> List[Dict]:
-        """
-        Pull character data from AniList.
-        We'll grab name, series, image, favorites count.
-        We'll stop once we hit 'limit'.
-        """
-        query = """
-        query ($page: Int, $perPage: Int) {
-            Page(page: $page, perPage: $perPage) {
-                characters {
-                    name {
-                        full
-                        native
-                    }
-                    image {
-                        large
-                    }
-                    media {
-                        nodes {
-                            title {
-                                romaji
-                            }
+    def key(endpoint: str, query: str, variables: Dict) -> str:
+        canonical = json.dumps(
+            {"endpoint": endpoint.rstrip("/"), "query": " ".join(query.split()),
+             "variables": variables},
+            sort_keys=True, separators=(",", ":"),
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _files(self) -> List[Tuple[str, os.stat_result]]:
+        found = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        found.append((path, os.stat(path)))
+                    except FileNotFoundError:
+                        pass
+        return found
+
+    def _read(self, key: str, allow_stale: bool) -> Optional[Dict]:
+        path = self._path(key)
+        try:
+            st = os.stat(path)
+            if not allow_stale and time.time() - st.st_mtime > self.ttl_seconds:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # bump atime only: mtime stays the stored-at time
+            os.utime(path, (time.time(), st.st_mtime))
+            return data
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, key: str, data: Dict):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+
+        # swap the file in and account for it in one step
+        with self._size_lock:
+            if self._size is None:
+                self._size = sum(st.st_size for _, st in self._files())
+            try:
+                self._size -= os.stat(path).st_size
+            except FileNotFoundError:
+                pass
+            os.replace(tmp, path)
+            self._size += os.stat(path).st_size
+
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """caller holds _size_lock."""
+        # oldest access first, down to 90% so we don't evict on every write
+        target = int(self.max_bytes * 0.9)
+        files = sorted(self._files(), key=lambda item: item[1].st_atime)
+        self._size = sum(st.st_size for _, st in files)
+        for path, st in files:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+                self._size -= st.st_size
+            except FileNotFoundError:
+                pass
+
+    async def get(self, endpoint: str, query: str, variables: Dict,
+                  allow_stale: bool = False) -> Optional[Dict]:
+        data = await asyncio.to_thread(self._read, self.key(endpoint, query, variables), allow_stale)
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    async def put(self, endpoint: str, query: str, variables: Dict, data: Dict):
+        await asyncio.to_thread(self._write, self.key(endpoint, query, variables), data)
+
+class TokenBucket:
+    """
+    Request budget for AniList. Refills at capacity/minute; capacity and the
+    current level are re-synced from X-RateLimit-* headers on every response,
+    and a 429's Retry-After blocks all callers until it passes.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        rate = self.capacity / 60.0
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) * 60.0 / self.capacity)
+
+    def update(self, headers):
+        limit = headers.get("X-RateLimit-Limit")
+        remaining = headers.get("X-RateLimit-Remaining")
+        if limit and limit.isdigit() and int(limit) > 0:
+            self.capacity = float(limit)
+        if remaining and remaining.isdigit():
+            # responses land out of order, so only ever trust the lower number
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, float(remaining))
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+class AniListAPI:
+    """
+    AniList GraphQL client. One keep-alive session for the bot's lifetime;
+    pages are fetched several at a time behind a shared TokenBucket, with
+    retry and backoff on 429 / 5xx / network errors.
+    """
+
+    CHARACTER_QUERY = """
+    query ($page: Int, $perPage: Int, $sort: [CharacterSort]) {
+        Page(page: $page, perPage: $perPage) {
+            pageInfo {
+                hasNextPage
+            }
+            characters(sort: $sort) {
+                id
+                name {
+                    full
+                    native
+                }
+                image {
+                    large
+                }
+                media {
+                    nodes {
+                        title {
+                            romaji
                         }
                     }
-                    favourites
                 }
+                favourites
             }
         }
+    }
+    """
+
+    def __init__(self, base_url: str = ANILIST_URL, concurrency: int = ANILIST_CONCURRENCY,
+                 cache: Optional[ResponseCache] = None, offline: bool = ANILIST_OFFLINE):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.limiter = TokenBucket(ANILIST_RATE_PER_MINUTE)
+        self.cache = cache
+        self.offline = offline
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # created lazily: aiohttp wants a running loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                timeout=aiohttp.ClientTimeout(total=ANILIST_TIMEOUT_SECONDS),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def query(self, query: str, variables: Dict, fresh: bool = False) -> Dict:
+        """
+        Cached GraphQL call. fresh=True skips the cache read (but still
+        stores the answer); offline mode never touches the network and
+        returns {} for anything not cached, however old the entry is.
+        """
+        if self.cache is not None and (self.offline or not fresh):
+            cached = await self.cache.get(self.base_url, query, variables, allow_stale=self.offline)
+            if cached is not None:
+                return cached
+        if self.offline:
+            return {}
+
+        data = await self._post(query, variables)
+        if self.cache is not None and not data.get("errors"):
+            await self.cache.put(self.base_url, query, variables, data)
+        return data
+
+    async def _post(self, query: str, variables: Dict) -> Dict:
+        last_error = "no attempts made"
+        for attempt in range(ANILIST_MAX_RETRIES + 1):
+            if attempt:
+                # exponential backoff with jitter, capped at 30s
+                await asyncio.sleep(min(30.0, 2 ** attempt) * random.uniform(0.5, 1.0))
+
+            await self.limiter.acquire()
+            try:
+                async with self._get_session().post(
+                    self.base_url,
+                    json={"query": query, "variables": variables}
+                ) as resp:
+                    self.limiter.update(resp.headers)
+
+                    if resp.status == 429:
+                        retry_after = resp.headers.get("Retry-After", "60")
+                        self.limiter.block(float(retry_after) if retry_after.isdigit() else 60.0)
+                        last_error = "HTTP 429"
+                        continue
+                    if resp.status >= 500:
+                        last_error = f"HTTP {resp.status}"
+                        continue
+                    if resp.status != 200:
+                        # bad query or auth problem, retrying won't help
+                        raise AniListError(f"AniList HTTP {resp.status}")
+
+                    return await resp.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = f"{type(e).__name__}: {e}"
+
+        raise AniListError(
+            f"AniList request failed after {ANILIST_MAX_RETRIES + 1} attempts ({last_error})"
+        )
+
+    @staticmethod
+    def _parse_character(ch: Dict) -> Dict:
+        name = ch.get("name") or {}
+        image = ch.get("image") or {}
+        media_nodes = (ch.get("media") or {}).get("nodes") or []
+        series = "Unknown Series"
+        if media_nodes:
+            series = (media_nodes[0].get("title") or {}).get("romaji") or "Unknown Series"
+
+        return {
+            "anilist_id": ch.get("id"),
+            "name": name.get("full") or "Unknown",
+            "name_native": name.get("native") or "",
+            "image_url": image.get("large") or "",
+            "series": series,
+            "favorites": ch.get("favourites") or 0,
+        }
+
+    async def fetch_page(self, page: int, sort: str = "ID", fresh: bool = False,
+                         per_page: int = ANILIST_PER_PAGE) -> Tuple[List[Dict], bool]:
         """
+        One page of characters, plus whether AniList has more after it.
+        ID order keeps pages stable: new characters only ever land at the end.
+        """
+        data = await self.query(
+            self.CHARACTER_QUERY,
+            {"page": page, "perPage": per_page, "sort": [sort]},
+            fresh=fresh,
+        )
+        page_data = (data.get("data") or {}).get("Page") or {}
+        characters = [self._parse_character(ch) for ch in page_data.get("characters") or []]
+        has_next = bool((page_data.get("pageInfo") or {}).get("hasNextPage"))
+        return characters, has_next and bool(characters)
 
-        characters: List[Dict] = []
+    async def iter_pages(self, limit: int, start_page: int = 1, sort: str = "ID",
+                         fresh: bool = False) -> AsyncIterator[Tuple[int, List[Dict]]]:
+        """
+        Yield (page, characters) in page order until `limit` characters have
+        been yielded or AniList runs out. Up to `concurrency` later pages are
+        already in flight while the caller handles the current one.
+        """
+        next_page = start_page
+        in_flight: Dict[int, asyncio.Task] = {}
+        remaining = limit
 
-        async with aiohttp.ClientSession() as session:
-            page = 1
-            per_page = 50
+        try:
+            while remaining > 0:
+                # don't run ahead further than `remaining` could need
+                while (len(in_flight) < self.concurrency
+                       and len(in_flight) * ANILIST_PER_PAGE < remaining):
+                    in_flight[next_page] = asyncio.create_task(self.fetch_page(next_page, sort, fresh))
+                    next_page += 1
+                if not in_flight:
+                    break
 
-            while len(characters) < limit and page <= 20:
-                variables = {"page": page, "perPage": per_page}
-                try:
-                    async with session.post(
-                        AniListAPI.BASE_URL,
-                        json={"query": query, "variables": variables}
-                    ) as resp:
-                        if resp.status != 200:
-                            print(f"AniList HTTP {resp.status}")
-                            break
-
-                        data = await resp.json()
-                        page_chars = (
-                            data.get("data", {})
-                                .get("Page", {})
-                                .get("characters", [])
-                        )
-
-                        for ch in page_chars:
-                            name = ch.get("name", {}).get("full", "Unknown")
-                            name_native = ch.get("name", {}).get("native", "")
-                            img = ch.get("image", {}).get("large", "")
-                            favs = ch.get("favourites", 0)
-
-                            media_nodes = ch.get("media", {}).get("nodes", [])
-                            series = "Unknown Series"
-                            if media_nodes:
-                                series = (
-                                    media_nodes[0]
-                                    .get("title", {})
-                                    .get("romaji", "Unknown Series")
-                                )
-
-                            characters.append({
-                                "name": name,
-                                "name_native": name_native,
-                                "image_url": img,
-                                "series": series,
-                                "favorites": favs
-                            })
-
-                            if len(characters) >= limit:
-                                break
-
-                    await asyncio.sleep(1)  # chill so AniList doesn't slap us
-                except Exception as e:
-                    print(f"Error fetching page {page}: {e}")
-                    await asyncio.sleep(1)
-                page += 1
+                page = min(in_flight)
+                characters, has_next = await in_flight.pop(page)
+                characters = characters[:remaining]
+                remaining -= len(characters)
+                yield page, characters
+
+                if not has_next:
+                    break
+        finally:
+            for task in in_flight.values():
+                task.cancel()
 
+    async def fetch_characters(self, limit: int = 100) -> List[Dict]:
+        """
+        Pull character data from AniList.
+        We'll grab name, series, image, favorites count.
+        We'll stop once we hit 'limit'.
+        """
+        characters: List[Dict] = []
+        async for _, page_chars in self.iter_pages(limit):
+            characters.extend(page_chars)
         return characters
 
+anilist = AniListAPI(cache=ResponseCache(
+    ANILIST_CACHE_DIR,
+    ttl_seconds=ANILIST_CACHE_TTL_HOURS * 3600,
+    max_bytes=ANILIST_CACHE_MAX_MB * 1024 * 1024,
+))
+
+async def sync_catalog(limit: int = POPULATE_MAX, refresh_pages: int = SYNC_REFRESH_PAGES,
+                       on_page: Optional[Callable] = None) -> Dict:
+    """
+    Incremental catalog top-up. Walks ID-ordered pages from the saved
+    checkpoint (re-reading the last page, which may have been partial),
+    then re-checks the most-favourited pages, where favourites and so
+    rarity/value move fastest. Each page commits with its checkpoint.
+    """
+    state = await get_sync_state("characters") or {}
+    start_page = state.get("last_page") or 1
+    totals = {"start_page": start_page, "fetched": 0, "added": 0, "updated": 0}
+
+    async def run_pass(pages: AsyncIterator, track_cursor: bool):
+        async for page, characters in pages:
+            cards = [card_from_character(ch) for ch in characters if ch.get("anilist_id")]
+            checkpoint = None
+            if track_cursor:
+                checkpoint = {
+                    "name": "characters",
+                    "last_page": page,
+                    "last_anilist_id": max((c["anilist_id"] for c in cards), default=0),
+                    "synced_at": dt_to_str(now_utc()),
+                }
+            result = await sync_cards(cards, checkpoint)
+            totals["fetched"] += len(characters)
+            totals["added"] += len(result["new_ids"])
+            totals["updated"] += result["updated"]
+            totals["page"] = page
+            if on_page:
+                await on_page(totals)
+
+    # a sync exists to see what changed, so it always asks AniList
+    # (offline mode still replays whatever the cache has)
+    await run_pass(anilist.iter_pages(limit, start_page=start_page, fresh=True), True)
+    if refresh_pages > 0:
+        await run_pass(
+            anilist.iter_pages(refresh_pages * ANILIST_PER_PAGE, sort="FAVOURITES_DESC", fresh=True),
+            False,
+        )
+    # refreshed favourites can move existing cards to another rarity bucket
+    await check_roll_pool()
+    return totals
+
 # ==================== BOT SETUP ====================
 
 intents = discord.Intents.default()
@@ -428,23 +3305,148 @@ intents.members = True
 intents.messages = True
 intents.message_content = True  # required for prefix commands that read messages
 
-bot = commands.Bot(command_prefix="$", intents=intents)
+class GachaBot(commands.Bot):
+    # set in setup_hook; close() also runs when login fails before it
+    metrics_runner: Optional[web.AppRunner] = None
+
+    async def setup_hook(self):
+        # create DB if first run
+        await setup_db()
+        await load_series()
+        await load_roll_pool()
+        await check_roll_pool()
+        await load_wish_index()
+        sweep_roll_windows.start()
+        if SYNC_INTERVAL_HOURS > 0:
+            scheduled_sync.change_interval(hours=SYNC_INTERVAL_HOURS)
+            scheduled_sync.start()
+        if METRICS_SAMPLE_RATE > 0:
+            watch_loop_lag.start()
+        self.metrics_runner = await start_metrics_server(METRICS_PORT) if METRICS_PORT else None
+
+    async def close(self):
+        await super().close()
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+            self.metrics_runner = None
+        # both are no-ops when setup_hook never got to use them
+        await anilist.close()
+        await db.aclose()
 
-# in-memory recent rolls so we can claim
-# bot.last_rolls[msg_id] = {
-#   "card_id": ...,
-#   "roller_id": ...,
-#   "rolled_at": iso string
+# one process per shard: SHARD_COUNT=4 SHARD_ID=0..3, with ROLL_WINDOW_BACKEND=sqlite
+shard_options = {"shard_id": SHARD_ID, "shard_count": SHARD_COUNT} if SHARD_COUNT > 0 else {}
+bot = GachaBot(command_prefix="$", intents=intents, **shard_options)
+
+# recent rolls so we can claim, in this process or in roll_windows
+# await bot.last_rolls.get(channel_id, roller_id) -> {
+#   "card_ids": [...],          # one per card in the roll, in display order
+#   "message_id": ...,
+#   "expires_at": deadline (monotonic in memory, epoch seconds in sqlite)
 # }
-bot.last_rolls = {}
+bot.last_rolls = make_roll_window_store(ROLL_WINDOW_BACKEND, CLAIM_WINDOW_SECONDS)
+
+@tasks.loop(seconds=CLAIM_WINDOW_SECONDS)
+async def sweep_roll_windows():
+    await bot.last_rolls.purge()
+
+@tasks.loop(seconds=LOOP_LAG_INTERVAL_SECONDS)
+async def watch_loop_lag():
+    # a sleep(0) resumes after every callback already queued has run, so
+    # this is how long anything that becomes ready now waits for the loop
+    t0 = time.perf_counter()
+    await asyncio.sleep(0)
+    metrics.loop_lag.observe(time.perf_counter() - t0)
+
+@bot.before_invoke
+async def before_command(ctx: commands.Context):
+    ctx.metrics_t0 = metrics.start()
+    if profiler.command is not None:
+        profiler.enter(ctx.command.qualified_name)
+
+@bot.after_invoke
+async def after_command(ctx: commands.Context):
+    # runs whether the command returned or raised
+    name = ctx.command.qualified_name
+    timing = metrics.timing("command", name)
+    timing.calls += 1
+    if ctx.command_failed:
+        timing.errors += 1
+    t0 = getattr(ctx, "metrics_t0", None)
+    if t0 is not None:
+        timing.latency.observe(time.perf_counter() - t0)
+    if profiler.command is not None and profiler.exit(name):
+        asyncio.create_task(finish_profile())
+
+def metrics_gauges() -> Dict[str, Tuple[str, float]]:
+    """point-in-time values that live on other objects, read at scrape time."""
+    windows = bot.last_rolls.stats()
+    users = user_cache.stats()
+    return {
+        "gacha_roll_windows": ("open claim windows (bot.last_rolls).", windows["size"]),
+        "gacha_roll_window_deadlines": ("claim-window heap entries, stale ones included.", windows["deadlines"]),
+        "gacha_roll_windows_expired_total": ("claim windows that expired unclaimed.", windows["evicted"]),
+        "gacha_roll_pool_cards": ("cards that can come up on a roll.", len(roll_pool)),
+        "gacha_user_cache_size": ("users held in the LRU cache.", users["size"]),
+        "gacha_user_cache_hits_total": ("user cache hits.", users["hits"]),
+        "gacha_user_cache_misses_total": ("user cache misses.", users["misses"]),
+        "gacha_db_commits_total": ("group commits.", db.commits),
+        "gacha_db_writes_total": ("writes applied through group commits.", db.writes),
+        "gacha_event_loop_lag_max_seconds": ("largest event-loop lag seen.", metrics.loop_lag.max),
+        "gacha_uptime_seconds": ("seconds since start.", time.monotonic() - metrics.started_at),
+    }
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        text=metrics.render(metrics_gauges()),
+        content_type="text/plain",
+    )
+
+async def start_metrics_server(port: int) -> web.AppRunner:
+    """serve GET /metrics on METRICS_HOST:port (loopback unless configured otherwise)."""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS_HOST, port).start()
+    print(f"Metrics at http://{METRICS_HOST}:{port}/metrics")
+    return runner
+
+@tasks.loop(hours=24)
+async def scheduled_sync():
+    try:
+        totals = await sync_catalog()
+    except AniListError as e:
+        print(f"Scheduled sync failed: {e}")
+        return
+    print(
+        f"Scheduled sync from page {totals['start_page']}: "
+        f"{totals['added']} added, {totals['updated']} updated."
+    )
+
+@scheduled_sync.before_loop
+async def wait_for_next_sync():
+    # a restart doesn't re-sync: the first run waits until one interval
+    # after the last sync's checkpoint (a bot that never synced starts now)
+    state = await get_sync_state("characters")
+    if not state or not state["synced_at"]:
+        return
+    last = datetime.fromisoformat(state["synced_at"])
+    wait = SYNC_INTERVAL_HOURS * 3600 - (now_utc() - last).total_seconds()
+    if wait > 0:
+        print(f"Next scheduled sync in {humanize_delta(timedelta(seconds=wait))}.")
+        await asyncio.sleep(wait)
 
 # ==================== INTERNAL HELPERS ====================
 
 def is_bot_owner(user_id: int) -> bool:
     return user_id in BOT_OWNER_IDS
 
-async def send_cooldown(ctx: commands.Context, base_msg: str, next_time: datetime):
-    delta = next_time - now_utc()
+def guild_of(ctx: commands.Context) -> int:
+    """guild whose claims a command reads and writes; DMs see the home server's."""
+    return ctx.guild.id if ctx.guild is not None else GUILD_ID
+
+async def send_cooldown(ctx: commands.Context, base_msg: str, ready_at: int):
+    delta = timedelta(seconds=ready_at - now_ts())
     await ctx.send(
         f"{ctx.author.mention} {base_msg} Try again in {humanize_delta(delta)}."
     )
@@ -455,20 +3457,34 @@ async def send_cooldown(ctx: commands.Context, base_msg: str, next_time: datetim
 async def on_ready():
     guild_info = f"in guild {GUILD_ID}" if GUILD_ID != 0 else ""
     print(f"{bot.user} is online {guild_info} and ready.")
+    # collections migrated without GUILD_ID set belong to the only server we're in
+    if GUILD_ID == 0 and len(bot.guilds) == 1:
+        moved = await adopt_unassigned_claims(bot.guilds[0].id)
+        if moved:
+            print(f"Moved {moved} pre-existing claims to guild {bot.guilds[0].id}.")
 
 @bot.command(name="info")
 async def info_cmd(ctx: commands.Context):
     msg = (
         "**Anime Card Game Info**\n"
-        "• `$w` (or `$roll`) rolls a random character. You get limited rolls per hour.\n"
+        "• `$w` (or `$roll`) rolls a random character. Higher ★ cards are rarer. You get limited rolls per hour.\n"
+        "• `$w <n>` / `$wx` spend several rolls at once; `$claim <n>` picks one of them.\n"
         "• `$claim` claims your latest roll. Claim cooldown is 3 hours.\n"
         "• `$daily` gives you free cash every 20 hours.\n"
         "• Claiming also gives bonus cash.\n"
         "• `$inventory` shows collections.\n"
+        "• `$leaderboard [cards|value]` (or `$lb`) shows the top collectors.\n"
+        "• `$search <name>` (or `$lookup`) finds a character and who owns it.\n"
+        "• `$series <title>` lists a series and its owners; `$completion` shows how much of each you own.\n"
+        "• `$wish <name>` pings you when someone rolls that character; `$wishlist` / `$unwish` manage it.\n"
         "• `$balance` shows your cash.\n"
+        "• `$cooldowns` (or `$cd`) shows your rolls and every cooldown at once.\n"
         "• `$rolls` gives a fresh batch of rolls (vote reset style), but only every 12h.\n"
         "• `$populate <num>` (owner only) bulk-loads characters from AniList.\n"
+        "• `$sync` (owner only) tops up new/changed characters since the last sync.\n"
         "• `$addcard` lets owner add a single custom character.\n"
+        "• `$stats` (owner only) shows command / database latency and cache stats.\n"
+        "• `$profile start|dump|stop` (owner only) profiles the live bot for a window or a command's next runs.\n"
         "\nAnti-abuse:\n"
         "• Only the roller can claim their roll, and only for a short window.\n"
         "• No infinite roll spam.\n"
@@ -479,36 +3495,41 @@ async def info_cmd(ctx: commands.Context):
 @bot.command(name="balance")
 async def balance_cmd(ctx: commands.Context):
     user_id = ctx.author.id
-    user_data = get_user(user_id)
+    user = await get_user(user_id)
     await ctx.send(
-        f"{ctx.author.mention} you currently have {user_data['cash']} cash."
+        f"{ctx.author.mention} you currently have {user.cash} cash."
     )
 
 @bot.command(name="daily")
 async def daily_cmd(ctx: commands.Context):
     user_id = ctx.author.id
-    user_data = get_user(user_id)
-
-    now = now_utc()
-    last_daily_dt = str_to_dt(user_data["daily_time"])
-
-    if last_daily_dt:
-        elapsed = now - last_daily_dt
-        if elapsed < timedelta(hours=DAILY_COOLDOWN_HOURS):
-            next_time = last_daily_dt + timedelta(hours=DAILY_COOLDOWN_HOURS)
-            await send_cooldown(
-                ctx,
-                "Daily already claimed.",
-                next_time
-            )
-            return
+    user = await get_user(user_id)
+
+    now = now_ts()
+    ready_at = cooldowns(user, now).daily
 
+    if ready_at > now:
+        await send_cooldown(
+            ctx,
+            "Daily already claimed.",
+            ready_at
+        )
+        return
+
+    # the cooldown is checked again inside the write, so a double $daily
+    # can't slip past it
     reward = random.randint(CASH_DAILY_MIN, CASH_DAILY_MAX)
-    new_cash = add_cash(user_id, reward)
-    set_daily_time(user_id, dt_to_str(now))
+    rewarded, user = await claim_daily(user_id, reward, now)
+    if not rewarded:
+        await send_cooldown(
+            ctx,
+            "Daily already claimed.",
+            cooldowns(user, now).daily
+        )
+        return
 
     await ctx.send(
-        f"{ctx.author.mention} you received {reward} cash. New balance: {new_cash}."
+        f"{ctx.author.mention} you received {reward} cash. New balance: {user.cash}."
     )
 
 @bot.command(name="rolls")
@@ -518,28 +3539,52 @@ async def rolls_cmd(ctx: commands.Context):
     Cooldown 12h between uses.
     """
     user_id = ctx.author.id
-    user_data = get_user(user_id)
-
-    now = now_utc()
-    last_vote_dt = str_to_dt(user_data["last_vote"])
-
-    if last_vote_dt:
-        elapsed = now - last_vote_dt
-        if elapsed < timedelta(hours=VOTE_RESET_HOURS):
-            next_time = last_vote_dt + timedelta(hours=VOTE_RESET_HOURS)
-            await send_cooldown(
-                ctx,
-                "You already used your roll reset.",
-                next_time
-            )
-            return
+    user = await get_user(user_id)
+
+    now = now_ts()
+    ready_at = cooldowns(user, now).vote
+
+    if ready_at > now:
+        await send_cooldown(
+            ctx,
+            "You already used your roll reset.",
+            ready_at
+        )
+        return
 
-    record_vote_and_reset_rolls(user_id, dt_to_str(now), ROLL_LIMIT)
+    reset, user = await record_vote_and_reset_rolls(user_id, now, ROLL_LIMIT)
+    if not reset:
+        await send_cooldown(
+            ctx,
+            "You already used your roll reset.",
+            cooldowns(user, now).vote
+        )
+        return
 
     await ctx.send(
         f"{ctx.author.mention} your rolls have been reset to {ROLL_LIMIT}."
     )
 
+@bot.command(name="cooldowns", aliases=["cd"])
+async def cooldowns_cmd(ctx: commands.Context):
+    user = await get_user(ctx.author.id)
+    now = now_ts()
+    cd = cooldowns(user, now)
+
+    def status(ready_at: int) -> str:
+        if ready_at <= now:
+            return "ready"
+        return f"in {humanize_delta(timedelta(seconds=ready_at - now))}"
+
+    await ctx.send(
+        f"{ctx.author.mention} cooldowns:\n"
+        f"• Rolls: {cd.rolls_left}/{ROLL_LIMIT} left"
+        + (f", refill {status(cd.rolls)}" if cd.rolls_left == 0 else "") + "\n"
+        f"• Claim: {status(cd.claim)}\n"
+        f"• Daily: {status(cd.daily)}\n"
+        f"• Roll reset ($rolls): {status(cd.vote)}"
+    )
+
 @bot.command(name="vote")
 async def vote_cmd(ctx: commands.Context):
     await ctx.send(
@@ -548,191 +3593,550 @@ async def vote_cmd(ctx: commands.Context):
         f"then use `$rolls` to refresh your rolls."
     )
 
-@bot.command(name="w", aliases=["roll"])
-async def roll_cmd(ctx: commands.Context):
+def roll_embed(card: Dict, roller: discord.abc.User, number: Optional[int] = None) -> discord.Embed:
+    title = card["name"] if number is None else f"#{number} {card['name']}"
+    claim_hint = "$claim" if number is None else f"$claim {number}"
+    embed = discord.Embed(
+        title=title,
+        description=(
+            f"Series: {card['series']}\n"
+            f"Rarity: {card['rarity']}★\n"
+            f"Value: {card['value']} cash"
+        ),
+        color=discord.Color.purple()
+    )
+    embed.set_footer(
+        text=f"Rolled by {roller.display_name} • Use {claim_hint} within {CLAIM_WINDOW_SECONDS}s"
+    )
+    if card["image_url"]:
+        embed.set_image(url=card["image_url"])
+    return embed
+
+async def do_rolls(ctx: commands.Context, count: int):
+    """
+    Spend `count` rolls as one batch: one transaction for the rolls, one
+    query for the cards, one message (one embed per card) and one claim
+    window entry holding all of them.
+    """
     # block DMs so people can't farm secretly
     if ctx.guild is None:
         await ctx.send("Use this command in a server, not in DMs.")
         return
 
-    user_id = ctx.author.id
-    user_data = get_user(user_id)
-    now = now_utc()
+    # don't burn a roll on an empty catalog (or one this server has claimed out)
+    guild_id = guild_of(ctx)
+    if not roll_pool.available(guild_id):
+        await ctx.send(
+            "No cards left to roll. "
+            "Owner needs to run `$populate 200` or `$addcard ...`"
+        )
+        return
 
-    last_batch_dt = str_to_dt(user_data["last_roll_batch"])
-    rolls_left = user_data["rolls_left"]
+    count = max(1, min(count, MULTI_ROLL_MAX))
+    user_id = ctx.author.id
+    now = now_ts()
 
-    # refresh batch if time passed
-    need_refresh = (last_batch_dt is None) or (
-        now - last_batch_dt >= timedelta(hours=ROLL_RESET_HOURS)
-    )
-    if need_refresh:
-        grant_new_roll_batch(user_id, dt_to_str(now), ROLL_LIMIT)
-        rolls_left = ROLL_LIMIT
-        last_batch_dt = now
+    # out of rolls per the cached record: reject without touching sqlite
+    user = await get_user(user_id)
+    cards = []
+    if cooldowns(user, now).rolls_left > 0:
+        # refresh batch if time passed, then fetch the cards and spend one
+        # roll per card found (one transaction)
+        cards, user = await consume_rolls(guild_id, user_id, count, now)
 
-    # out of rolls
-    if rolls_left <= 0:
-        reset_time = last_batch_dt + timedelta(hours=ROLL_RESET_HOURS)
+    if not cards:
+        if cooldowns(user, now).rolls_left > 0:
+            await ctx.send("Couldn't find a card to roll, try again.")
+            return
+        # out of rolls
         await send_cooldown(
             ctx,
             "No rolls left.",
-            reset_time
-        )
-        return
-
-    # get a random card
-    card = get_random_card()
-    if not card:
-        await ctx.send(
-            "No cards in the database yet. "
-            "Owner needs to run `$populate 200` or `$addcard ...`"
+            cooldowns(user, now).rolls
         )
         return
 
-    # create embed
-    embed = discord.Embed(
-        title=card["name"],
-        description=(
-            f"Series: {card['series']}\n"
-            f"Rarity: {card['rarity']}★\n"
-            f"Value: {card['value']} cash"
-        ),
-        color=discord.Color.purple()
-    )
-    embed.set_footer(
-        text=f"Rolled by {ctx.author.display_name} • Use $claim within {CLAIM_WINDOW_SECONDS}s"
-    )
-    if card["image_url"]:
-        embed.set_image(url=card["image_url"])
+    # ping whoever wished for these
+    wished = await wishers_of([card["card_id"] for card in cards])
+    wish_lines = []
+    for i, card in enumerate(cards, 1):
+        wishers = wished.get(card["card_id"], frozenset()) - {user_id}
+        if wishers:
+            prefix = "" if len(cards) == 1 else f"#{i} "
+            mentions = " ".join(f"<@{uid}>" for uid in sorted(wishers))
+            wish_lines.append(f"💫 {prefix}**{card['name']}** is on the wishlist of {mentions}")
+    wish_note = "\n".join(wish_lines) or None
 
     # send publicly
-    sent_message = await ctx.send(embed=embed)
+    if len(cards) == 1:
+        sent_message = await ctx.send(wish_note, embed=roll_embed(cards[0], ctx.author))
+    else:
+        note = ""
+        if len(cards) < count:
+            # fewer cards than asked for: out of rolls, or of unclaimed cards
+            if cooldowns(user, now).rolls_left == 0:
+                note = f"Only had {len(cards)} rolls left. "
+            else:
+                note = f"Only {len(cards)} cards left to roll. "
+        content = f"{note}{ctx.author.mention} pick one with `$claim <1-{len(cards)}>`."
+        if wish_note:
+            content += "\n" + wish_note
+        sent_message = await ctx.send(
+            content,
+            embeds=[roll_embed(card, ctx.author, i) for i, card in enumerate(cards, 1)],
+        )
 
     # remember roll so $claim can target it
-    bot.last_rolls[sent_message.id] = {
-        "card_id": card["card_id"],
-        "roller_id": user_id,
-        "rolled_at": dt_to_str(now),
-    }
+    await bot.last_rolls.put(ctx.channel.id, user_id, {
+        "card_ids": [card["card_id"] for card in cards],
+        "message_id": sent_message.id,
+    })
+
+@bot.command(name="w", aliases=["roll"])
+async def roll_cmd(ctx: commands.Context, count: int = 1):
+    await do_rolls(ctx, count)
 
-    # spend 1 roll
-    new_left = rolls_left - 1
-    set_rolls_left(user_id, new_left)
+@bot.command(name="wx")
+async def multi_roll_cmd(ctx: commands.Context):
+    await do_rolls(ctx, MULTI_ROLL_MAX)
 
 @bot.command(name="claim", aliases=["c"])
-async def claim_cmd(ctx: commands.Context):
+async def claim_cmd(ctx: commands.Context, number: Optional[int] = None):
     # no DM farming
     if ctx.guild is None:
         await ctx.send("Use this command in a server, not in DMs.")
         return
 
     user_id = ctx.author.id
-    user_data = get_user(user_id)
-    now = now_utc()
-
-    # 3h claim cooldown
-    last_claim_dt = str_to_dt(user_data["last_claim"])
-    if last_claim_dt:
-        elapsed = now - last_claim_dt
-        if elapsed < timedelta(hours=CLAIM_COOLDOWN_HOURS):
-            next_time = last_claim_dt + timedelta(hours=CLAIM_COOLDOWN_HOURS)
-            await send_cooldown(
-                ctx,
-                "You already claimed recently.",
-                next_time
-            )
-            return
-
-    # find most recent eligible roll from THIS user in THIS channel
-    target_message = None
-    target_data = None
-
-    async for message in ctx.channel.history(limit=25):
-        if message.author.id != bot.user.id:
-            continue
-        if message.id not in bot.last_rolls:
-            continue
-
-        roll_data = bot.last_rolls[message.id]
-
-        # must match roller
-        if roll_data["roller_id"] != user_id:
-            continue
-
-        rolled_at_dt = str_to_dt(roll_data["rolled_at"])
-        if not rolled_at_dt:
-            continue
+    now = now_ts()
 
-        # must be within claim window
-        if (now - rolled_at_dt).total_seconds() > CLAIM_WINDOW_SECONDS:
-            continue
+    # 3h claim cooldown, answered from the cached record
+    user = await get_user(user_id)
+    ready_at = cooldowns(user, now).claim
+    if ready_at > now:
+        await send_cooldown(
+            ctx,
+            "You already claimed recently.",
+            ready_at
+        )
+        return
 
-        target_message = message
-        target_data = roll_data
-        break
+    # most recent unexpired roll from THIS user in THIS channel
+    roll_data = await bot.last_rolls.get(ctx.channel.id, user_id)
 
-    if not target_data:
+    if not roll_data:
         await ctx.send(
             f"{ctx.author.mention} no recent roll found for you, or claim window expired."
         )
         return
 
-    card_id = target_data["card_id"]
-
-    # give them the card
-    add_card_to_inventory(user_id, card_id)
+    # a multi-roll holds several cards: say which one
+    card_ids = roll_data["card_ids"]
+    if number is None and len(card_ids) == 1:
+        number = 1
+    if number is None or not 1 <= number <= len(card_ids):
+        await ctx.send(
+            f"{ctx.author.mention} you rolled {len(card_ids)} cards, "
+            f"pick one with `$claim <1-{len(card_ids)}>`."
+        )
+        return
 
-    # reward money
+    # the cooldown is checked again inside the claim transaction, so a
+    # double $claim can't slip past it
     reward = random.randint(CASH_CLAIM_MIN, CASH_CLAIM_MAX)
-    new_cash = add_cash(user_id, reward)
+    result = await claim_card(
+        guild_of(ctx),
+        user_id,
+        card_ids[number - 1],
+        reward,
+        now,
+    )
+
+    if result.get("taken"):
+        await ctx.send(
+            f"{ctx.author.mention} someone else already claimed that card."
+        )
+        return
 
-    # set claim cooldown
-    set_last_claim(user_id, dt_to_str(now))
+    if not result["claimed"]:
+        await send_cooldown(
+            ctx,
+            "You already claimed recently.",
+            cooldowns(result["user"], now).claim
+        )
+        return
 
-    # burn this roll so it can't be claimed twice
-    if target_message.id in bot.last_rolls:
-        del bot.last_rolls[target_message.id]
+    # burn this roll so it can't be claimed twice; a newer $w sent meanwhile stays
+    await bot.last_rolls.pop(ctx.channel.id, user_id, roll_data["message_id"])
 
-    # reply nicely
-    card_info = get_card_by_id(card_id)
-    char_name = card_info["name"] if card_info else "Unknown Card"
+    char_name = result["name"] or "Unknown Card"
 
     await ctx.send(
         f"{ctx.author.mention} claimed **{char_name}** "
-        f"and earned {reward} cash. Balance: {new_cash}."
+        f"and earned {reward} cash. Balance: {result['user'].cash}."
     )
 
+def _card_key(card: Dict) -> Tuple[int, int, int]:
+    return (card["rarity"], card["value"], card["card_id"])
+
+class InventoryView(discord.ui.View):
+    """Prev/next buttons for $inventory. Each click fetches one keyset page."""
+
+    def __init__(self, viewer_id: int, guild_id: int, target: discord.abc.User, summary: Dict,
+                 cards: List[Dict]):
+        super().__init__(timeout=INVENTORY_VIEW_SECONDS)
+        self.viewer_id = viewer_id
+        self.guild_id = guild_id
+        self.target = target
+        self.summary = summary
+        self.cards = cards
+        self.page = 0
+        self.pages = max(1, -(-summary["card_count"] // INVENTORY_PAGE_SIZE))
+        self.message: Optional[discord.Message] = None
+        self._refresh_buttons()
+
+    def _refresh_buttons(self):
+        self.prev_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= self.pages - 1
+
+    def embed(self) -> discord.Embed:
+        lines = [
+            f"[{card['card_id']}] {card['name']} ({card['series']}) "
+            f"| {card['rarity']}★ | {card['value']} cash"
+            for card in self.cards
+        ]
+        embed = discord.Embed(
+            title=f"{self.target.display_name}'s Inventory",
+            description="\n".join(lines) or "Nothing on this page.",
+            color=discord.Color.gold()
+        )
+        by_rarity = " ".join(
+            f"{r}★×{n}" for r, n in sorted(self.summary["by_rarity"].items(), reverse=True) if n
+        )
+        embed.set_footer(
+            text=(
+                f"Total cards: {self.summary['card_count']} • "
+                f"Estimated value: {self.summary['total_value']} cash • "
+                f"Page {self.page + 1}/{self.pages}"
+                + (f"\n{by_rarity}" if by_rarity else "")
+            )
+        )
+        return embed
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.viewer_id:
+            await interaction.response.send_message(
+                "Run `$inventory` yourself to page through it.", ephemeral=True
+            )
+            return False
+        return True
+
+    async def _show(self, interaction: discord.Interaction, cards: List[Dict], step: int):
+        if cards:
+            self.cards = cards
+            self.page += step
+        self._refresh_buttons()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        cards = await get_inventory_page(self.guild_id, self.target.id, before=_card_key(self.cards[0]))
+        await self._show(interaction, cards, -1)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        cards = await get_inventory_page(self.guild_id, self.target.id, after=_card_key(self.cards[-1]))
+        await self._show(interaction, cards, 1)
+
+    async def on_timeout(self):
+        self.prev_page.disabled = True
+        self.next_page.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
 @bot.command(name="inventory")
 async def inventory_cmd(ctx: commands.Context, user: Optional[discord.Member] = None):
     target = user or ctx.author
-    inv = get_inventory(target.id)
+    guild_id = guild_of(ctx)
+    summary, cards = await asyncio.gather(
+        get_inventory_summary(guild_id, target.id),
+        get_inventory_page(guild_id, target.id),
+    )
 
-    if not inv:
+    if not cards:
         await ctx.send(f"{target.display_name} has no cards.")
         return
 
-    lines = []
-    total_value = 0
-    for i, card in enumerate(inv):
-        if i >= 20:
-            lines.append("...and more.")
-            break
-        lines.append(
-            f"[{card['card_id']}] {card['name']} ({card['series']}) "
-            f"| {card['rarity']}★ | {card['value']} cash"
+    view = InventoryView(ctx.author.id, guild_id, target, summary, cards)
+    if view.pages == 1:
+        # nothing to page through
+        await ctx.send(embed=view.embed())
+        return
+    view.message = await ctx.send(embed=view.embed(), view=view)
+
+class SearchView(discord.ui.View):
+    """Prev/next buttons for $search results."""
+
+    def __init__(self, viewer_id: int, guild_id: int, text: str, cards: List[Dict], has_next: bool):
+        super().__init__(timeout=INVENTORY_VIEW_SECONDS)
+        self.viewer_id = viewer_id
+        self.guild_id = guild_id
+        self.text = text
+        self.cards = cards
+        self.has_next = has_next
+        self.page = 0
+        self.message: Optional[discord.Message] = None
+        self._refresh_buttons()
+
+    def _refresh_buttons(self):
+        self.prev_page.disabled = self.page <= 0
+        self.next_page.disabled = not self.has_next
+
+    def embed(self) -> discord.Embed:
+        lines = []
+        for card in self.cards:
+            owner = f"owned by <@{card['owner_id']}>" if card["owner_id"] else "unclaimed"
+            lines.append(
+                f"[{card['card_id']}] **{card['name']}** ({card['series']}) "
+                f"| {card['rarity']}★ | {owner}"
+            )
+        embed = discord.Embed(
+            title=f"Search: {self.text}",
+            description="\n".join(lines),
+            color=discord.Color.blue()
         )
-        total_value += card["value"]
+        embed.set_footer(text=f"Page {self.page + 1}")
+        return embed
 
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.viewer_id:
+            await interaction.response.send_message(
+                "Run `$search` yourself to page through it.", ephemeral=True
+            )
+            return False
+        return True
+
+    async def _show(self, interaction: discord.Interaction, step: int):
+        page = self.page + step
+        cards, has_next = await search_cards(self.guild_id, self.text, offset=page * SEARCH_PAGE_SIZE)
+        if cards:
+            self.cards, self.has_next, self.page = cards, has_next, page
+        self._refresh_buttons()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, -1)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, 1)
+
+    async def on_timeout(self):
+        self.prev_page.disabled = True
+        self.next_page.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+@bot.command(name="search", aliases=["lookup"])
+async def search_cmd(ctx: commands.Context, *, text: str = ""):
+    """
+    Find characters in the catalog and who owns them.
+    Usage: $search <name / series / native name>
+    """
+    if not _search_terms(text):
+        await ctx.send("Usage: `$search <name>` — e.g. `$search asuka` or `$search evangelion`")
+        return
+
+    guild_id = guild_of(ctx)
+    cards, has_next = await search_cards(guild_id, text)
+    if not cards:
+        await ctx.send(f"No characters matching **{text}**.")
+        return
+
+    view = SearchView(ctx.author.id, guild_id, text, cards, has_next)
+    if not has_next:
+        await ctx.send(embed=view.embed())
+        return
+    view.message = await ctx.send(embed=view.embed(), view=view)
+
+async def resolve_card(ctx: commands.Context, text: str, usage: str) -> Optional[Dict]:
+    """
+    Card for a "<card_id or name>" argument. A unique search hit (or an
+    exact name match among the hits) wins; otherwise list candidates.
+    """
+    text = text.strip()
+    if text.isdigit():
+        card = await get_card_by_id(guild_of(ctx), int(text))
+        if card is None:
+            await ctx.send(f"No card with id {text}.")
+        return card
+
+    cards, _ = await search_cards(guild_of(ctx), text, limit=5)
+    exact = [c for c in cards if c["name"].lower() == text.lower()]
+    if len(cards) == 1 or len(exact) == 1:
+        return exact[0] if exact else cards[0]
+    if not cards:
+        await ctx.send(f"No characters matching **{text}**.")
+        return None
+    options = "\n".join(f"[{c['card_id']}] {c['name']} ({c['series']})" for c in cards)
+    await ctx.send(f"Which one? Use `{usage} <id>`:\n{options}")
+    return None
+
+@bot.command(name="wish")
+async def wish_cmd(ctx: commands.Context, *, character: str = ""):
+    """
+    Get pinged when someone rolls a character.
+    Usage: $wish <name or card id>
+    """
+    if not character.strip():
+        await ctx.send(f"Usage: `$wish <name or card id>` (up to {WISHLIST_MAX} wishes)")
+        return
+
+    card = await resolve_card(ctx, character, "$wish")
+    if card is None:
+        return
+
+    status = await add_wish(ctx.author.id, card["card_id"])
+    if status == "full":
+        await ctx.send(
+            f"{ctx.author.mention} your wishlist is full ({WISHLIST_MAX}). "
+            f"Remove one with `$unwish` first."
+        )
+    elif status == "exists":
+        await ctx.send(f"{ctx.author.mention} **{card['name']}** is already on your wishlist.")
+    else:
+        await ctx.send(
+            f"{ctx.author.mention} added **{card['name']}** ({card['series']}) to your wishlist. "
+            f"You'll be pinged when someone rolls it."
+        )
+
+@bot.command(name="unwish")
+async def unwish_cmd(ctx: commands.Context, *, character: str = ""):
+    if not character.strip():
+        await ctx.send("Usage: `$unwish <name or card id>`")
+        return
+
+    card = await resolve_card(ctx, character, "$unwish")
+    if card is None:
+        return
+
+    if await remove_wish(ctx.author.id, card["card_id"]):
+        await ctx.send(f"{ctx.author.mention} removed **{card['name']}** from your wishlist.")
+    else:
+        await ctx.send(f"{ctx.author.mention} **{card['name']}** isn't on your wishlist.")
+
+@bot.command(name="wishlist", aliases=["wl"])
+async def wishlist_cmd(ctx: commands.Context, user: Optional[discord.Member] = None):
+    target = user or ctx.author
+    cards = await get_wishlist(guild_of(ctx), target.id)
+    if not cards:
+        await ctx.send(f"{target.display_name}'s wishlist is empty. Add to it with `$wish <name>`.")
+        return
+
+    lines = []
+    for card in cards:
+        owner = f"owned by <@{card['owner_id']}>" if card["owner_id"] else "unclaimed"
+        lines.append(f"[{card['card_id']}] {card['name']} ({card['series']}) | {card['rarity']}★ | {owner}")
     embed = discord.Embed(
-        title=f"{target.display_name}'s Inventory",
+        title=f"{target.display_name}'s Wishlist",
         description="\n".join(lines),
-        color=discord.Color.gold()
+        color=discord.Color.magenta()
+    )
+    embed.set_footer(text=f"{len(cards)}/{WISHLIST_MAX} wishes")
+    await ctx.send(embed=embed)
+
+@bot.command(name="series")
+async def series_cmd(ctx: commands.Context, *, title: str = ""):
+    """
+    Every character of one series, who owns them, and your completion.
+    Usage: $series <title>
+    """
+    title = title.strip()
+    if not title:
+        await ctx.send("Usage: `$series <title>` — e.g. `$series naruto`")
+        return
+
+    matches = await find_series(title)
+    if not matches:
+        await ctx.send(f"No series matching **{title}**.")
+        return
+    if len(matches) > 1 and matches[0][1].lower() != title.lower():
+        options = "\n".join(f"• {t}" for _, t in matches)
+        await ctx.send(f"Which series?\n{options}")
+        return
+
+    series_id, series_title = matches[0]
+    cards = await get_series_cards(guild_of(ctx), series_id)
+    lines = []
+    for card in cards[:SERIES_LIST_MAX]:
+        owner = f"<@{card['owner_id']}>" if card["owner_id"] else "unclaimed"
+        lines.append(f"[{card['card_id']}] {card['name']} | {card['rarity']}★ | {owner}")
+    if len(cards) > SERIES_LIST_MAX:
+        lines.append(f"… and {len(cards) - SERIES_LIST_MAX} more")
+
+    owned = sum(1 for card in cards if card["owner_id"] == ctx.author.id)
+    embed = discord.Embed(
+        title=series_title,
+        description="\n".join(lines) or "No characters yet.",
+        color=discord.Color.teal()
     )
     embed.set_footer(
-        text=f"Total cards: {len(inv)} • Estimated value: {total_value} cash"
+        text=f"{len(cards)} characters • you own {owned} ({owned * 100 // max(1, len(cards))}%)"
+    )
+    await ctx.send(embed=embed)
+
+@bot.command(name="completion")
+async def completion_cmd(ctx: commands.Context, user: Optional[discord.Member] = None):
+    """Series completion percentages for a collection."""
+    target = user or ctx.author
+    rows = await get_series_completion(guild_of(ctx), target.id)
+    if not rows:
+        await ctx.send(f"{target.display_name} has no cards.")
+        return
+
+    lines = [
+        f"{title} — {owned}/{total} ({owned * 100 // total}%)"
+        for title, owned, total in rows
+    ]
+    embed = discord.Embed(
+        title=f"{target.display_name}'s Series Completion",
+        description="\n".join(lines),
+        color=discord.Color.teal()
     )
+    await ctx.send(embed=embed)
+
+@bot.command(name="leaderboard", aliases=["lb", "top"])
+async def leaderboard_cmd(ctx: commands.Context, metric: str = "cards"):
+    """
+    Top collectors by card count or collection value.
+    Usage: $leaderboard [cards|value]
+    """
+    metric = metric.lower()
+    if metric not in LEADERBOARD_METRICS:
+        await ctx.send("Usage: `$leaderboard [cards|value]`")
+        return
+
+    rows = await get_leaderboard(guild_of(ctx), metric)
+    if not rows:
+        await ctx.send("Nobody has claimed anything yet.")
+        return
 
+    lines = [
+        f"**{rank}.** <@{user_id}> — {card_count} cards • {total_value} cash"
+        for rank, (user_id, card_count, total_value) in enumerate(rows, 1)
+    ]
+    embed = discord.Embed(
+        title=f"Top collectors by {'card count' if metric == 'cards' else 'collection value'}",
+        description="\n".join(lines),
+        color=discord.Color.gold()
+    )
     await ctx.send(embed=embed)
 
 @bot.command(name="addcard")
@@ -768,8 +4172,13 @@ async def addcard_cmd(
         )
         return
 
+    existing_id = await character_exists(name, series)
+    if existing_id:
+        await ctx.send(f"{name} ({series}) is already in the database as card {existing_id}.")
+        return
+
     # insert
-    card_id = insert_card(name, series, age, image_url, rarity, value)
+    card_id = await insert_card(name, series, age, image_url, rarity, value)
 
     await ctx.send(
         f"Card added with ID {card_id}: {name} ({series}), rarity {rarity}★, value {value}."
@@ -789,43 +4198,226 @@ async def populate_cmd(ctx: commands.Context, limit: int = 500):
     # sanity clamp
     if limit < 1:
         limit = 1
-    if limit > 1000:
-        limit = 1000
+    if limit > POPULATE_MAX:
+        limit = POPULATE_MAX
 
-    await ctx.send(
-        f"🔄 Fetching up to {limit} characters from AniList... this will take a moment."
+    progress = await ctx.send(
+        f"🔄 Fetching up to {limit} characters from AniList..."
     )
 
-    characters = await AniListAPI.fetch_characters(limit)
+    # pages stream in (later ones already downloading) and each one is
+    # deduped and written in a single transaction as it arrives
+    known = await get_catalog_keys()
+    fetched = 0
     added = 0
+    last_edit = time.monotonic()
 
-    for ch in characters:
-        name = ch["name"]
-        series = ch["series"]
-        img = ch["image_url"]
-        favs = ch["favorites"]
+    try:
+        async for page, characters in anilist.iter_pages(limit):
+            fetched += len(characters)
 
-        # skip if already exists (name+series match)
-        if character_exists(name, series):
-            continue
+            new_cards = []
+            for ch in characters:
+                key = (ch["name"], ch["series"])
+                # skip if already exists (name+series match)
+                if key in known:
+                    continue
+                known.add(key)
+                new_cards.append(card_from_character(ch))
 
-        # make rarity/value from favorites
-        rarity = min(5, max(1, favs // 1000))
-        value = max(100, rarity * 100 + favs // 10)
+            if new_cards:
+                added += len(await insert_cards(new_cards))
 
-        insert_card(
-            name=name,
-            series=series,
-            age="unknown",
-            image_url=img,
-            rarity=rarity,
-            value=value
+            if time.monotonic() - last_edit >= POPULATE_PROGRESS_SECONDS:
+                last_edit = time.monotonic()
+                await progress.edit(
+                    content=f"🔄 Page {page}: fetched {fetched}/{limit}, added {added} new characters..."
+                )
+    except AniListError as e:
+        await progress.edit(
+            content=f"❌ {e}\nStopped after fetching {fetched}; added {added} new characters."
         )
-        added += 1
+        return
 
-    await ctx.send(
-        f"✅ Added {added} new characters to the database."
+    await progress.edit(
+        content=f"✅ Added {added} new characters to the database ({fetched} fetched)."
+    )
+
+@bot.command(name="sync")
+async def sync_cmd(ctx: commands.Context, refresh_pages: int = SYNC_REFRESH_PAGES):
+    """
+    Owner-only incremental top-up from AniList. Resumes where the last
+    sync stopped and refreshes favourites/rarity of the most popular pages.
+    Example: $sync 10
+    """
+    if ctx.author.id not in BOT_OWNER_IDS:
+        await ctx.send("You are not authorized to sync the database. This action is owner-only.")
+        return
+
+    refresh_pages = max(0, min(refresh_pages, POPULATE_MAX // ANILIST_PER_PAGE))
+    state = await get_sync_state("characters")
+    since = f"page {state['last_page']} (last run {state['synced_at']})" if state else "page 1"
+    progress = await ctx.send(f"🔄 Syncing from AniList, resuming at {since}...")
+    last_edit = time.monotonic()
+
+    async def report(totals: Dict):
+        nonlocal last_edit
+        if time.monotonic() - last_edit < POPULATE_PROGRESS_SECONDS:
+            return
+        last_edit = time.monotonic()
+        await progress.edit(
+            content=(
+                f"🔄 Page {totals['page']}: {totals['added']} added, "
+                f"{totals['updated']} updated..."
+            )
+        )
+
+    try:
+        totals = await sync_catalog(refresh_pages=refresh_pages, on_page=report)
+    except AniListError as e:
+        await progress.edit(content=f"❌ {e}\nProgress up to the last finished page is saved.")
+        return
+
+    await progress.edit(
+        content=(
+            f"✅ Sync done: {totals['added']} new characters, "
+            f"{totals['updated']} updated ({totals['fetched']} fetched)."
+        )
+    )
+
+def _timing_lines(timings: Dict[str, Timing], key: Callable) -> str:
+    lines = []
+    called = [item for item in timings.items() if item[1].calls]
+    for name, t in sorted(called, key=key, reverse=True)[:STATS_TOP]:
+        lat = t.latency
+        line = f"`{name}` {t.calls} calls"
+        if t.errors:
+            line += f", {t.errors} errors"
+        if lat.count:
+            line += (
+                f" | p50 {lat.quantile(0.5) * 1000:.1f} / p95 {lat.quantile(0.95) * 1000:.1f}"
+                f" / p99 {lat.quantile(0.99) * 1000:.1f} ms"
+            )
+        lines.append(line)
+    return "\n".join(lines) or "nothing yet"
+
+@bot.command(name="stats")
+async def stats_cmd(ctx: commands.Context):
+    """
+    Owner-only view of the in-process metrics: busiest commands, slowest
+    db functions, event-loop lag and cache sizes.
+    """
+    if ctx.author.id not in BOT_OWNER_IDS:
+        await ctx.send("You are not authorized to view bot stats. This action is owner-only.")
+        return
+
+    windows = bot.last_rolls.stats()
+    users = user_cache.stats()
+    lookups = users["hits"] + users["misses"]
+    lag = metrics.loop_lag
+    embed = discord.Embed(
+        title="Bot Stats",
+        description=(
+            f"Up {humanize_delta(timedelta(seconds=time.monotonic() - metrics.started_at))}, "
+            f"latency sampled at {metrics.sample_rate:g}\n"
+            f"Event loop lag: p50 {lag.quantile(0.5) * 1000:.1f} / p99 {lag.quantile(0.99) * 1000:.1f} / "
+            f"max {lag.max * 1000:.1f} ms\n"
+            f"Claim windows: {windows['size']} open, {windows['evicted']} expired, {windows['claimed']} claimed\n"
+            f"User cache: {users['size']} users, "
+            f"{users['hits'] / lookups if lookups else 0:.1%} hit rate\n"
+            f"DB: {db.writes} writes in {db.commits} commits | roll pool {len(roll_pool)} cards"
+        ),
+        color=discord.Color.dark_grey()
+    )
+    embed.add_field(
+        name="Commands (by calls)",
+        value=_timing_lines(metrics.timings("command"), key=lambda item: item[1].calls)[:1024],
+        inline=False,
     )
+    embed.add_field(
+        name="DB functions (by sampled time)",
+        value=_timing_lines(metrics.timings("db"), key=lambda item: item[1].latency.total)[:1024],
+        inline=False,
+    )
+    await ctx.send(embed=embed)
+
+def profile_embed(title: str, report: Dict) -> discord.Embed:
+    lines = [f"{report['seconds']:.1f}s recorded, {report['samples']} stack samples", "", "**Top functions (self time)**"]
+    for name, calls, tottime, cumtime in report["functions"]:
+        lines.append(f"`{tottime * 1000:.1f} ms` self / {cumtime * 1000:.1f} ms cum, {calls} calls: {name}")
+    lines += ["", "**Top allocation growth**"]
+    for site, size_diff, count_diff in report["allocations"]:
+        lines.append(f"`{size_diff / 1024:+.1f} KiB` ({count_diff:+d} blocks): {site}")
+    embed = discord.Embed(title=title, description="\n".join(lines)[:4096], color=discord.Color.dark_grey())
+    embed.add_field(name="Files", value="\n".join(f"`{path}`" for path in report["paths"].values()), inline=False)
+    return embed
+
+async def finish_profile():
+    channel = profiler.channel
+    title = f"Profile `{profiler.label}` finished"
+    report = await profiler.stop()
+    if report is not None:  # else $profile stop got there first
+        await channel.send(embed=profile_embed(title, report))
+
+async def _profile_window(seconds: int):
+    await asyncio.sleep(seconds)
+    await finish_profile()
+
+@bot.command(name="profile")
+async def profile_cmd(ctx: commands.Context, action: str = "", target: str = "", runs: int = 10):
+    """
+    Owner-only live profiling (cProfile + stack sampling + tracemalloc).
+    $profile start [seconds]       everything, for a time window
+    $profile start <command> [n]   the next n runs of one command
+    $profile dump                  write what's recorded so far
+    $profile stop                  stop early and report
+    """
+    if ctx.author.id not in BOT_OWNER_IDS:
+        await ctx.send("You are not authorized to profile the bot. This action is owner-only.")
+        return
+
+    action = action.lower()
+    if action == "start":
+        if profiler.active:
+            await ctx.send(f"Already profiling `{profiler.label}`. Use `$profile stop` first.")
+            return
+        if not target or target.isdigit():
+            seconds = max(1, min(int(target) if target else PROFILE_DEFAULT_SECONDS, PROFILE_MAX_SECONDS))
+            profiler.channel = ctx.channel
+            profiler.start(f"window-{seconds}s")
+            profiler.timer = asyncio.create_task(_profile_window(seconds))
+            await ctx.send(f"🔬 Profiling everything for {seconds}s. Reports go to `{PROFILE_DIR}/`.")
+            return
+        command = bot.get_command(target.lstrip("$"))
+        if command is None:
+            await ctx.send(f"No command `${target.lstrip('$')}`.")
+            return
+        runs = max(1, min(runs, PROFILE_MAX_INVOCATIONS))
+        profiler.channel = ctx.channel
+        profiler.start(f"{command.qualified_name}-x{runs}", command=command.qualified_name, runs=runs)
+        await ctx.send(
+            f"🔬 Profiling the next {runs} run(s) of `${command.qualified_name}`. "
+            f"Reports go to `{PROFILE_DIR}/`."
+        )
+    elif action in ("stop", "dump"):
+        if not profiler.active:
+            await ctx.send("No profile running. Start one with `$profile start`.")
+            return
+        title = f"Profile `{profiler.label}` " + ("stopped" if action == "stop" else "so far")
+        report = await (profiler.stop() if action == "stop" else profiler.dump())
+        if report is None:
+            await ctx.send("The profile just finished; its report is above.")
+            return
+        await ctx.send(embed=profile_embed(title, report))
+    elif profiler.active:
+        elapsed = humanize_delta(timedelta(seconds=time.monotonic() - profiler.started_at))
+        left = f", {profiler.remaining} run(s) to go" if profiler.command else ""
+        await ctx.send(f"Profiling `{profiler.label}` for {elapsed}{left}.")
+    else:
+        await ctx.send(
+            "Usage: `$profile start [seconds]`, `$profile start <command> [n]`, "
+            "`$profile dump`, `$profile stop`"
+        )
 
 # ==================== RUN BOT ====================
 
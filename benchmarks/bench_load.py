@@ -0,0 +1,176 @@
+"""
+Load test: N simulated users driving the real commands, no Discord.
+
+Seeds a temp database with a synthetic catalog, then runs the command
+callbacks ($daily, $w, $claim, $inventory, then an owner $populate against
+the fake AniList server) through fake_discord contexts, all users at once
+per phase. Every SQL statement the bot's connections execute is counted
+with sqlite3's trace callback; phases don't overlap, so the counts divide
+cleanly per command.
+
+    python benchmarks/bench_load.py
+    python benchmarks/bench_load.py --users 500 --cards 100000 --populate 5000
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List
+
+from _support import bulk_seed, load_bot, summarize, temp_db_path
+from fake_anilist import FakeAniList, start
+from fake_discord import FakeChannel, FakeContext, FakeGuild, FakeUser
+
+CONTROL = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE", "PRAGMA")
+OWNER_ID = 1
+
+
+class StatementCounter:
+    """sqlite3 trace callback: counts statements from every db thread."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, sql: str):
+        # "-- TRIGGER name" lines mark trigger bodies, not statements we sent
+        if sql.startswith("--"):
+            kind = "trigger"
+        elif sql.lstrip().upper().startswith(CONTROL):
+            kind = "control"
+        else:
+            kind = "query"
+        with self._lock:
+            self.counts[kind] += 1
+
+    def snapshot(self) -> Counter:
+        with self._lock:
+            return Counter(self.counts)
+
+
+def counting_db(bot_mod, path: str, counter: StatementCounter):
+    """the bot's AsyncDB with the trace callback on every connection it opens."""
+
+    class CountingDB(bot_mod.AsyncDB):
+        def _open(self):
+            super()._open()
+            self._local.conn.set_trace_callback(counter.record)
+
+    return CountingDB(path)
+
+
+class Phase:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.wall = 0.0
+        self.statements = Counter()
+        self.commits = 0
+
+
+async def run_phase(phase: Phase, calls: List[Callable[[], Awaitable]], bot_mod,
+                    counter: StatementCounter):
+    async def timed(call):
+        t0 = time.perf_counter()
+        await call()
+        phase.latencies.append(time.perf_counter() - t0)
+
+    before, commits = counter.snapshot(), bot_mod.db.commits
+    t0 = time.perf_counter()
+    await asyncio.gather(*(timed(call) for call in calls))
+    phase.wall += time.perf_counter() - t0
+    phase.statements += counter.snapshot() - before
+    phase.commits += bot_mod.db.commits - commits
+
+
+def report(phases: Dict[str, Phase]):
+    print(
+        f"{'command':>10} | {'n':>6} | {'cmds/s':>8} | {'p50 ms':>7} | {'p95 ms':>7} | "
+        f"{'p99 ms':>7} | {'queries/cmd':>11} | {'tx stmts/cmd':>12} | {'commits':>7}"
+    )
+    for phase in phases.values():
+        n = len(phase.latencies)
+        st = summarize(phase.latencies)
+        print(
+            f"{phase.name:>10} | {n:>6} | {n / phase.wall:>8.0f} | {st['p50'] / 1000:>7.2f} | "
+            f"{st['p95'] / 1000:>7.2f} | {st['p99'] / 1000:>7.2f} | "
+            f"{phase.statements['query'] / n:>11.2f} | {phase.statements['control'] / n:>12.2f} | "
+            f"{phase.commits:>7}"
+        )
+
+
+async def run(args):
+    path = temp_db_path()
+    bot_mod = load_bot(path)
+    counter = StatementCounter()
+    bot_mod.db = counting_db(bot_mod, path, counter)
+    if args.commit_window_ms is not None:
+        bot_mod.db.commit_window = args.commit_window_ms / 1000.0
+
+    await bot_mod.setup_db()
+    t0 = time.perf_counter()
+    bulk_seed(path, args.cards, names=True)
+    # as at startup: setup_db backfills the typo index bulk_seed bypassed
+    await bot_mod.setup_db()
+    await bot_mod.load_series()
+    await bot_mod.load_roll_pool()
+    await bot_mod.load_wish_index()
+    print(f"seeded {args.cards} cards in {time.perf_counter() - t0:.1f}s; "
+          f"{args.users} users, {args.users // args.users_per_channel or 1} channels")
+
+    guild = FakeGuild()
+    channels = [FakeChannel(100 + i) for i in range(max(1, args.users // args.users_per_channel))]
+    contexts = [
+        FakeContext(bot_mod.bot, FakeUser(1000 + i), channels[i % len(channels)], guild)
+        for i in range(args.users)
+    ]
+
+    phases = {name: Phase(name) for name in ("daily", "roll", "claim", "inventory", "populate")}
+
+    await run_phase(phases["daily"], [lambda c=c: bot_mod.daily_cmd.callback(c) for c in contexts],
+                    bot_mod, counter)
+    for _ in range(args.rolls):
+        await run_phase(phases["roll"], [lambda c=c: bot_mod.roll_cmd.callback(c) for c in contexts],
+                        bot_mod, counter)
+    await run_phase(phases["claim"], [lambda c=c: bot_mod.claim_cmd.callback(c) for c in contexts],
+                    bot_mod, counter)
+    await run_phase(phases["inventory"], [lambda c=c: bot_mod.inventory_cmd.callback(c) for c in contexts],
+                    bot_mod, counter)
+
+    if args.populate:
+        fake = FakeAniList(args.populate, rate_per_minute=60000)
+        runner, url = await start(fake)
+        bot_mod.anilist = bot_mod.AniListAPI(base_url=url)
+        bot_mod.BOT_OWNER_IDS.add(OWNER_ID)
+        owner = FakeContext(bot_mod.bot, FakeUser(OWNER_ID), channels[0], guild)
+        try:
+            await run_phase(phases["populate"],
+                            [lambda: bot_mod.populate_cmd.callback(owner, args.populate)],
+                            bot_mod, counter)
+        finally:
+            await bot_mod.anilist.close()
+            await runner.cleanup()
+    else:
+        del phases["populate"]
+
+    report(phases)
+    await bot_mod.db.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--users-per-channel", type=int, default=5)
+    parser.add_argument("--cards", type=int, default=50000, help="synthetic catalog size")
+    parser.add_argument("--rolls", type=int, default=10, help="$w per user")
+    parser.add_argument("--populate", type=int, default=2000,
+                        help="characters for one owner $populate (0 = skip)")
+    parser.add_argument("--commit-window-ms", type=float, default=None,
+                        help="override DB_COMMIT_WINDOW_MS")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
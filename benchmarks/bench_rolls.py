@@ -0,0 +1,76 @@
+"""
+Roll latency at different catalog sizes.
+
+Compares the roll engine (random index into RollIndex + primary-key fetch)
+against the old ORDER BY RANDOM() LIMIT 1 query.
+
+    python benchmarks/bench_rolls.py
+    python benchmarks/bench_rolls.py --sizes 1000 100000 --rolls 2000
+"""
+
+import argparse
+import asyncio
+import sqlite3
+import time
+
+from _support import load_bot, seed_catalog, summarize, temp_db_path
+
+GUILD_ID = 1
+
+ORDER_BY_RANDOM = """
+    SELECT c.card_id, c.name, s.title, c.age, c.image_url, c.rarity, c.value
+    FROM cards c
+    JOIN series s ON s.series_id = c.series_id
+    ORDER BY RANDOM()
+    LIMIT 1
+"""
+
+
+async def bench_size(n_cards: int, rolls: int, baseline_rolls: int):
+    path = temp_db_path()
+    bot_mod = load_bot(path)
+    await bot_mod.setup_db()
+    seed_catalog(path, n_cards)
+    await bot_mod.load_roll_pool()
+
+    engine = []
+    for _ in range(rolls):
+        t0 = time.perf_counter()
+        # what one $w does: a weighted pick, then the primary-key fetch
+        card = await bot_mod.get_card_by_id(GUILD_ID, bot_mod.roll_pool.pick(GUILD_ID))
+        engine.append(time.perf_counter() - t0)
+        assert card is not None
+
+    conn = sqlite3.connect(path)
+    baseline = []
+    for _ in range(baseline_rolls):
+        t0 = time.perf_counter()
+        conn.execute(ORDER_BY_RANDOM).fetchone()
+        baseline.append(time.perf_counter() - t0)
+    conn.close()
+    bot_mod.db.close()
+
+    return summarize(engine), summarize(baseline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--rolls", type=int, default=5000, help="engine rolls per size")
+    parser.add_argument("--baseline-rolls", type=int, default=20,
+                        help="ORDER BY RANDOM() rolls per size (slow on big catalogs)")
+    args = parser.parse_args()
+
+    print(f"{'cards':>10} | {'path':<16} | {'p50 us':>10} | {'p99 us':>10} | {'mean us':>10}")
+    print("-" * 68)
+    for n in args.sizes:
+        engine, baseline = asyncio.run(bench_size(n, args.rolls, args.baseline_rolls))
+        for label, stats in (("roll engine", engine), ("ORDER BY RANDOM", baseline)):
+            print(
+                f"{n:>10} | {label:<16} | {stats['p50']:>10.1f} | "
+                f"{stats['p99']:>10.1f} | {stats['mean']:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
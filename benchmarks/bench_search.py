@@ -0,0 +1,85 @@
+"""
+$search latency on a large catalog.
+
+Seeds a synthetic catalog with varied names, builds the FTS indexes, then
+times search_cards for a mix of queries taken from real rows: full names,
+word prefixes, series names, trigram-only substrings, names with a typo
+(which fall through to the fuzzy stage), and a deliberately broad two-letter
+prefix as the worst case.
+
+    python benchmarks/bench_search.py
+    python benchmarks/bench_search.py --cards 100000 --runs 200
+"""
+
+import argparse
+import asyncio
+import sqlite3
+import time
+
+from _support import bulk_seed, load_bot, summarize, temp_db_path
+
+
+BROAD = "ka"
+GUILD_ID = 1
+
+
+def queries(path: str, runs: int):
+    """query mix built from real rows: (label, text) pairs."""
+    conn = sqlite3.connect(path)
+    rows = conn.execute(
+        "SELECT name, series FROM cards_search ORDER BY RANDOM() LIMIT ?", (runs,)
+    ).fetchall()
+    conn.close()
+    mix = []
+    for name, series in rows:
+        first, last = name.split()
+        mix += [
+            ("full name", name),
+            ("name prefixes", f"{first[:3]} {last[:3]}"),
+            ("series", series),
+            ("substring (trigram)", last[1:-1] if len(last) > 4 else last),
+            ("typo (fuzzy)", f"{first} {last[0]}{last[2]}{last[1]}{last[3:]}"),
+        ]
+    return mix
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cards", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=300)
+    args = parser.parse_args()
+
+    path = temp_db_path()
+    bot_mod = load_bot(path)
+    await bot_mod.setup_db()
+    t0 = time.perf_counter()
+    bulk_seed(path, args.cards, names=True)
+    print(f"seeded and indexed {args.cards} cards in {time.perf_counter() - t0:.1f}s")
+    # the bot backfills the typo index at startup; bulk_seed bypassed it
+    t0 = time.perf_counter()
+    await bot_mod.setup_db()
+    print(f"built the typo index in {time.perf_counter() - t0:.1f}s")
+
+    samples = {}
+    for label, text in queries(path, args.runs):
+        t0 = time.perf_counter()
+        await bot_mod.search_cards(GUILD_ID, text)
+        samples.setdefault(label, []).append(time.perf_counter() - t0)
+
+    # worst case: a short prefix matches a big slice of the catalog and
+    # every match (up to the candidate cap) has to be ranked
+    for _ in range(3):
+        t0 = time.perf_counter()
+        await bot_mod.search_cards(GUILD_ID, BROAD)
+        samples.setdefault(f"broad prefix {BROAD!r}", []).append(time.perf_counter() - t0)
+
+    print(f"{'query':>22} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8}")
+    for label, s in samples.items():
+        st = summarize(s)
+        print(f"{label:>22} | {st['p50'] / 1000:>8.2f} | {st['p95'] / 1000:>8.2f} | {st['p99'] / 1000:>8.2f}")
+
+    bot_mod.db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Local stand-in for the AniList GraphQL endpoint.
+
+Answers the Page/characters query the bot sends with a deterministic
+synthetic catalog, sends X-RateLimit-* headers, and can inject 429s and
+errors (5xx by default) so the fetcher's limiter and retry paths can be exercised
+without touching the real API.
+
+    python benchmarks/fake_anilist.py --port 8765 --characters 20000
+    ANILIST_URL=http://127.0.0.1:8765/ python anigacha-bot.py
+"""
+
+import argparse
+import random
+from typing import Dict
+
+from aiohttp import web
+
+
+class FakeAniList:
+    def __init__(self, characters: int = 10000, rate_per_minute: int = 90,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 series_size: int = 25, seed: int = 7,
+                 throttle_first: int = 0, retry_after: int = 1, error_status: int = 500):
+        self.characters = characters
+        self.rate_per_minute = rate_per_minute
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.series_size = series_size
+        self.throttle_first = throttle_first    # 429 the first n requests, for tests
+        self.retry_after = retry_after
+        self.error_status = error_status        # what error_rate answers with, e.g. 400
+        self.requests = 0
+        self.throttled = 0
+        self.pages_served = 0
+        self.pages = []                         # page numbers served, in order
+        self._rng = random.Random(seed)
+
+    def character(self, char_id: int) -> Dict:
+        favs = int(random.Random(char_id).paretovariate(1.2) * 200)
+        return {
+            "id": char_id,
+            "name": {"full": f"Character {char_id}", "native": f"キャラ{char_id}"},
+            "image": {"large": f"https://img.example/{char_id}.png"},
+            "media": {"nodes": [{"title": {"romaji": f"Series {char_id // self.series_size}"}}]},
+            "favourites": favs,
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        headers = {
+            "X-RateLimit-Limit": str(self.rate_per_minute),
+            "X-RateLimit-Remaining": str(self.rate_per_minute - 1),
+        }
+        roll = self._rng.random()
+        if self.requests <= self.throttle_first or roll < self.throttle_rate:
+            self.throttled += 1
+            headers["Retry-After"] = str(self.retry_after)
+            return web.json_response({"errors": [{"message": "Too Many Requests."}]},
+                                     status=429, headers=headers)
+        if roll < self.throttle_rate + self.error_rate:
+            return web.json_response({"errors": [{"message": "boom"}]},
+                                     status=self.error_status, headers=headers)
+
+        body = await request.json()
+        variables = body.get("variables") or {}
+        page = int(variables.get("page", 1))
+        per_page = int(variables.get("perPage", 50))
+        first = (page - 1) * per_page + 1
+        last = min(self.characters, first + per_page - 1)
+
+        self.pages_served += 1
+        self.pages.append(page)
+        return web.json_response({
+            "data": {
+                "Page": {
+                    "pageInfo": {"hasNextPage": last < self.characters},
+                    "characters": [self.character(i) for i in range(first, last + 1)],
+                }
+            }
+        }, headers=headers)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/", self.handle)
+        return app
+
+
+async def start(fake: FakeAniList, host: str = "127.0.0.1", port: int = 0):
+    """run fake in the current loop; returns (runner, base_url)."""
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake AniList GraphQL server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--characters", type=int, default=10000)
+    parser.add_argument("--rate", type=int, default=90, help="advertised requests per minute")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeAniList(args.characters, args.rate, args.error_rate, args.throttle_rate)
+    web.run_app(fake.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
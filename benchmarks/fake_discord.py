@@ -0,0 +1,74 @@
+"""
+Stand-ins for the discord.py objects the bot's commands touch.
+
+Commands are plain coroutines behind `bot.command`, so a benchmark can
+call `roll_cmd.callback(ctx)` directly with a FakeContext: no gateway, no
+HTTP. Only what the commands actually use is implemented (ids, mentions,
+display names, send/edit); messages are counted rather than kept.
+"""
+
+import itertools
+from typing import Optional
+
+_ids = itertools.count(10 ** 17)
+
+
+class FakeUser:
+    def __init__(self, user_id: int, name: Optional[str] = None):
+        self.id = user_id
+        self.name = name or f"user{user_id}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int = 1):
+        self.id = guild_id
+        self._members = {}
+
+    def get_member(self, user_id: int) -> FakeUser:
+        return self._members.setdefault(user_id, FakeUser(user_id))
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.sent = 0
+        self.edits = 0
+        self.last: Optional["FakeMessage"] = None
+
+    async def send(self, content=None, *, embed=None, embeds=None, view=None, **_):
+        message = FakeMessage(self, content, embed, embeds, view)
+        self.sent += 1
+        self.last = message
+        return message
+
+
+class FakeMessage:
+    def __init__(self, channel: FakeChannel, content=None, embed=None, embeds=None, view=None):
+        self.id = next(_ids)
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.embeds = embeds
+        self.view = view
+
+    async def edit(self, **fields):
+        self.channel.edits += 1
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+
+class FakeContext:
+    """commands.Context as far as the bot's commands use it."""
+
+    def __init__(self, bot, author: FakeUser, channel: FakeChannel, guild: Optional[FakeGuild]):
+        self.bot = bot
+        self.author = author
+        self.channel = channel
+        self.guild = guild
+        self.message = FakeMessage(channel)
+
+    async def send(self, content=None, **fields):
+        return await self.channel.send(content, **fields)
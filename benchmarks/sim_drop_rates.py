@@ -0,0 +1,204 @@
+"""
+Check that weighted rolls hit the configured drop rates.
+
+Seeds a synthetic catalog, loads the roll pool, draws many rolls and runs
+chi-square goodness-of-fit tests: the observed (rarity, banner) bucket
+counts against expectations worked out here from the configured rates,
+the banner boost and the bucket sizes (not from RollPool), and the
+rarity shares against the normalised rates. It then claims a batch of
+cards in one guild and adds new ones (the incremental path) and tests
+again, for that guild and for one with no claims, and once more with
+most of the guild's cards claimed. Exits 1 if any test rejects at
+--alpha or a roll comes up with a card its guild already claimed.
+tests/test_drop_rates.py runs a seeded, smaller version under pytest.
+
+    python benchmarks/sim_drop_rates.py
+    python benchmarks/sim_drop_rates.py --rolls 500000 --rates 1:60,2:25,3:10,4:4,5:1
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import sqlite3
+import sys
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from _support import load_bot, seed_catalog, temp_db_path
+
+
+def chi2_sf(x: float, dof: int) -> float:
+    """P(X >= x) for a chi-square with dof degrees of freedom (regularised upper gamma)."""
+    a, z = dof / 2.0, x / 2.0
+    if z <= 0:
+        return 1.0
+    if z < a + 1:
+        # series for the lower incomplete gamma
+        term = total = 1.0 / a
+        n = a
+        while term > total * 1e-15:
+            n += 1
+            term *= z / n
+            total += term
+        return max(0.0, 1.0 - total * math.exp(-z + a * math.log(z) - math.lgamma(a)))
+    # continued fraction for the upper incomplete gamma (Lentz)
+    b = z + 1 - a
+    c = 1e300
+    d = 1 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = 1 / d if abs(d) > 1e-300 else 1e300
+        c = b + an / c if abs(c) > 1e-300 else 1e-300
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return h * math.exp(-z + a * math.log(z) - math.lgamma(a))
+
+
+GUILD_ID = 1
+
+
+def expected_buckets(cards: Dict[int, Tuple[int, bool]], rates: Dict[int, float],
+                     boost: float) -> Dict[Tuple[int, bool], float]:
+    """
+    Chance of each (rarity, banner) bucket per roll, worked out from the
+    configured rates, the banner boost and the cards still rollable,
+    independently of RollPool: a rarity with no cards drops out and the
+    other rates are rescaled; inside a rarity a banner card is `boost`
+    times as likely as a plain one.
+    """
+    sizes = Counter(cards.values())
+    live = {r: w for r, w in rates.items() if w > 0 and sizes[(r, False)] + sizes[(r, True)]}
+    total_rate = sum(live.values())
+    expected = {}
+    for rarity, rate in live.items():
+        plain, banner = sizes[(rarity, False)], sizes[(rarity, True)] * boost
+        for key, share in (((rarity, False), plain), ((rarity, True), banner)):
+            if share:
+                expected[key] = rate / total_rate * share / (plain + banner)
+    return expected
+
+
+def chi2(observed: Dict, expected: Dict, rolls: int) -> Tuple[float, float]:
+    stat = sum((observed.get(key, 0) - rolls * p) ** 2 / (rolls * p) for key, p in expected.items())
+    return stat, chi2_sf(stat, len(expected) - 1)
+
+
+def report(title: str, pool, cards: Dict[int, Tuple[int, bool]], rates: Dict[int, float],
+           boost: float, rolls: int, alpha: float, guild_id: Optional[int] = None) -> bool:
+    """
+    Roll `rolls` times and test the (rarity, banner) buckets against
+    expected_buckets, and the rarity shares against the configured rates.
+    `cards` is card_id -> (rarity, on banner) for what this guild can roll.
+    """
+    observed = Counter()
+    for _ in range(rolls):
+        card_id = pool.pick(guild_id)
+        if card_id not in cards:
+            raise AssertionError(f"guild {guild_id} rolled card {card_id}, which it can't roll")
+        observed[cards[card_id]] += 1
+    expected = expected_buckets(cards, rates, boost)
+    sizes = Counter(cards.values())
+
+    print(f"\n{title}: {len(cards)} rollable cards, {rolls} rolls")
+    print(f"{'rarity':>6} {'banner':>6} {'cards':>7} {'expected':>9} {'observed':>9}")
+    for key in sorted(expected):
+        rarity, banner = key
+        print(
+            f"{rarity:>6} {'yes' if banner else '':>6} {sizes[key]:>7} "
+            f"{expected[key]:>9.4%} {observed[key] / rolls:>9.4%}"
+        )
+    stat, p_value = chi2(observed, expected, rolls)
+    ok = p_value >= alpha
+    print(f"buckets: chi2 = {stat:.2f}, dof = {len(expected) - 1}, p = {p_value:.4f} -> "
+          f"{'ok' if ok else 'REJECT'}")
+
+    # rarity shares against RARITY_RATES itself, for the rarities that still have cards
+    live = {r: w for r, w in rates.items() if w > 0 and sizes[(r, False)] + sizes[(r, True)]}
+    configured = {r: w / sum(live.values()) for r, w in live.items()}
+    by_rarity = Counter()
+    for (rarity, _), n in observed.items():
+        by_rarity[rarity] += n
+    stat, p_value = chi2(by_rarity, configured, rolls)
+    print("rarity shares:", ", ".join(
+        f"{r}★ {by_rarity[r] / rolls:.2%} (rate {p:.2%})" for r, p in sorted(configured.items())
+    ))
+    rarity_ok = p_value >= alpha
+    print(f"rarities: chi2 = {stat:.2f}, dof = {len(configured) - 1}, p = {p_value:.4f} -> "
+          f"{'ok' if rarity_ok else 'REJECT'}")
+    return ok and rarity_ok
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cards", type=int, default=20000)
+    parser.add_argument("--rolls", type=int, default=200000)
+    parser.add_argument("--rates", default=None, help="RARITY_RATES override, e.g. 1:55,2:25,3:12,4:6,5:2")
+    parser.add_argument("--banner", default="Series 3|Series 7", help="BANNER_SERIES, |-separated")
+    parser.add_argument("--boost", type=float, default=3.0)
+    parser.add_argument("--alpha", type=float, default=0.001)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    path = temp_db_path()
+    bot_mod = load_bot(path)
+    rates = bot_mod.parse_rarity_rates(args.rates or bot_mod.RARITY_RATES)
+    banner = [s for s in args.banner.split("|") if s]
+    bot_mod.roll_pool = bot_mod.RollPool(rates, banner, args.boost)
+    await bot_mod.setup_db()
+    seed_catalog(path, args.cards)
+    await bot_mod.load_roll_pool()
+    pool = bot_mod.roll_pool
+
+    def bucket(rarity: int, series: str) -> Tuple[int, bool]:
+        # rarities outside RARITY_RATES roll with the nearest configured one
+        return min(max(rarity, min(rates)), max(rates)), series in banner
+
+    # the script's own record of the catalog: card_id -> (rarity, on banner)
+    conn = sqlite3.connect(path)
+    cards = {
+        card_id: bucket(rarity, title)
+        for card_id, rarity, title in conn.execute(
+            "SELECT c.card_id, c.rarity, s.title FROM cards c JOIN series s USING (series_id)"
+        )
+    }
+    conn.close()
+
+    def check(title, rollable, guild_id=None):
+        return report(title, pool, rollable, rates, args.boost, args.rolls, args.alpha, guild_id)
+
+    ok = check("after startup build", cards)
+
+    # incremental path: claims in one guild reweigh only its table, new cards
+    # append and every table goes dirty
+    claimed = set(random.sample(sorted(cards), len(cards) // 10))
+    for card_id in claimed:
+        pool.claim(GUILD_ID, card_id)
+    next_id = 10 ** 9
+    for i in range(len(cards) // 20):
+        rarity, series = random.randint(1, 5), random.choice(banner + ["New Series"])
+        pool.add(next_id + i, rarity, series)
+        cards[next_id + i] = bucket(rarity, series)
+    unclaimed = {card_id: key for card_id, key in cards.items() if card_id not in claimed}
+    ok = check(f"guild {GUILD_ID} after claims and inserts", unclaimed, GUILD_ID) and ok
+    ok = check("a guild with no claims", cards, GUILD_ID + 1) and ok
+
+    # most of every bucket claimed: picks come off the per-guild free lists
+    claimed |= set(random.sample(sorted(unclaimed), len(unclaimed) * 4 // 5))
+    for card_id in claimed:
+        pool.claim(GUILD_ID, card_id)
+    unclaimed = {card_id: key for card_id, key in cards.items() if card_id not in claimed}
+    ok = check(f"guild {GUILD_ID} with most cards claimed", unclaimed, GUILD_ID) and ok
+
+    bot_mod.db.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
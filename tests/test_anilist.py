@@ -0,0 +1,96 @@
+"""
+AniList fetcher against the local fake GraphQL server
+(benchmarks/fake_anilist.py): page order, 429 handling, end of catalog,
+and the errors that give up.
+
+    python -m pytest -q tests
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from _support import load_bot, temp_db_path
+from fake_anilist import FakeAniList, start
+
+bot_mod = load_bot(temp_db_path())
+
+
+def fetch(fake: FakeAniList, limit: int, concurrency: int = 4):
+    """run fetch_characters against fake; returns (characters, seconds)."""
+
+    async def run():
+        runner, url = await start(fake)
+        api = bot_mod.AniListAPI(base_url=url, concurrency=concurrency)
+        try:
+            t0 = time.monotonic()
+            characters = await api.fetch_characters(limit)
+            return characters, time.monotonic() - t0
+        finally:
+            await api.close()
+            await runner.cleanup()
+
+    return asyncio.run(run())
+
+
+def test_fetches_exactly_limit_in_page_order():
+    limit = bot_mod.ANILIST_PER_PAGE * 3 + 7
+    characters, _ = fetch(FakeAniList(characters=1000, rate_per_minute=60000), limit)
+
+    ids = [c["anilist_id"] for c in characters]
+    assert len(ids) == limit
+    assert len(set(ids)) == limit
+    # the fake numbers characters 1..n in ID order, so page order is id order
+    assert ids == list(range(1, limit + 1))
+
+
+def test_429_retry_after_is_honored_and_retried():
+    fake = FakeAniList(characters=1000, rate_per_minute=60000, throttle_first=1, retry_after=3)
+    characters, seconds = fetch(fake, bot_mod.ANILIST_PER_PAGE, concurrency=1)
+
+    assert [c["anilist_id"] for c in characters] == list(range(1, bot_mod.ANILIST_PER_PAGE + 1))
+    assert fake.throttled == 1
+    assert fake.requests == 2
+    # the retry waited out Retry-After, not just the (shorter) first backoff
+    assert seconds >= 3
+
+
+def test_last_page_stops_iteration():
+    per_page = bot_mod.ANILIST_PER_PAGE
+    fake = FakeAniList(characters=per_page + per_page // 2, rate_per_minute=60000)
+
+    async def run():
+        runner, url = await start(fake)
+        api = bot_mod.AniListAPI(base_url=url, concurrency=1)
+        try:
+            return [(page, len(chars)) async for page, chars in api.iter_pages(per_page * 10)]
+        finally:
+            await api.close()
+            await runner.cleanup()
+
+    pages = asyncio.run(run())
+    assert pages == [(1, per_page), (2, per_page // 2)]
+    assert fake.pages == [1, 2]
+
+
+def test_non_retryable_4xx_raises_at_once():
+    fake = FakeAniList(characters=1000, rate_per_minute=60000, error_rate=1.0, error_status=400)
+
+    with pytest.raises(bot_mod.AniListError, match="HTTP 400"):
+        fetch(fake, bot_mod.ANILIST_PER_PAGE, concurrency=1)
+    assert fake.requests == 1
+
+
+def test_5xx_gives_up_after_max_retries(monkeypatch):
+    # one retry keeps the backoff sleep to a second or two
+    monkeypatch.setattr(bot_mod, "ANILIST_MAX_RETRIES", 1)
+    fake = FakeAniList(characters=1000, rate_per_minute=60000, error_rate=1.0)
+
+    with pytest.raises(bot_mod.AniListError, match=r"after 2 attempts \(HTTP 500\)"):
+        fetch(fake, bot_mod.ANILIST_PER_PAGE, concurrency=1)
+    assert fake.requests == 2
@@ -0,0 +1,77 @@
+"""
+Seeded, small version of benchmarks/sim_drop_rates.py: rolled (rarity,
+banner) buckets and rarity shares against the configured rates, with and
+without claims. The expectations come from sim_drop_rates, not RollPool.
+
+    python -m pytest -q tests
+"""
+
+import os
+import random
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from _support import load_bot, temp_db_path
+from sim_drop_rates import chi2, expected_buckets
+
+bot_mod = load_bot(temp_db_path())
+
+RATES = bot_mod.parse_rarity_rates("1:55,2:25,3:12,4:6,5:2")
+BANNER = ["Series 3", "Series 7"]
+BOOST = 3.0
+ROLLS = 40000
+ALPHA = 0.001
+
+
+def catalog(n: int):
+    """n cards as (card_id, rarity, series) rows, with every rarity on and off the banner."""
+    rng = random.Random(11)
+    return [(card_id, rng.randint(1, 5), f"Series {card_id % 10}") for card_id in range(1, n + 1)]
+
+
+def make_pool(rows):
+    pool = bot_mod.RollPool(RATES, BANNER, BOOST)
+    pool.rebuild(rows)
+    # the test's own record of the catalog: card_id -> (rarity, on banner)
+    cards = {card_id: (rarity, series in BANNER) for card_id, rarity, series in rows}
+    return pool, cards
+
+
+def assert_rates(pool, cards, guild_id=None):
+    observed = Counter()
+    for _ in range(ROLLS):
+        card_id = pool.pick(guild_id)
+        assert card_id in cards, f"rolled card {card_id}, which guild {guild_id} can't roll"
+        observed[cards[card_id]] += 1
+
+    _, p_value = chi2(observed, expected_buckets(cards, RATES, BOOST), ROLLS)
+    assert p_value >= ALPHA, f"bucket counts {dict(observed)}"
+
+    by_rarity = Counter()
+    for (rarity, _), n in observed.items():
+        by_rarity[rarity] += n
+    total = sum(RATES.values())
+    _, p_value = chi2(by_rarity, {r: w / total for r, w in RATES.items()}, ROLLS)
+    assert p_value >= ALPHA, f"rarity counts {dict(by_rarity)}"
+
+
+def test_rolls_match_rates_and_banner_boost():
+    random.seed(1)
+    pool, cards = make_pool(catalog(2000))
+    assert_rates(pool, cards)
+
+
+def test_rolls_match_rates_after_claims():
+    random.seed(2)
+    pool, cards = make_pool(catalog(2000))
+    # 90% claimed: every bucket is past the free-list threshold
+    claimed = random.sample(sorted(cards), len(cards) * 9 // 10)
+    for card_id in claimed:
+        pool.claim(1, card_id)
+    unclaimed = {card_id: key for card_id, key in cards.items() if card_id not in set(claimed)}
+
+    assert_rates(pool, unclaimed, guild_id=1)
+    # another guild still rolls the whole catalog
+    assert_rates(pool, cards, guild_id=2)
@@ -0,0 +1,99 @@
+"""
+Schema migrations on a database from before schema_version: claimed cards
+survive the upgrade.
+
+    python -m pytest -q tests
+"""
+
+import asyncio
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from _support import load_bot, temp_db_path
+
+# the tables as the bot created them before migrations existed
+OLD_SCHEMA = """
+    CREATE TABLE users (
+        user_id INTEGER PRIMARY KEY,
+        cash INTEGER DEFAULT 1000,
+        daily_time TEXT,
+        last_roll_batch TEXT,
+        rolls_left INTEGER DEFAULT 10,
+        last_claim TEXT,
+        last_vote TEXT,
+        vote_count INTEGER DEFAULT 0,
+        is_admin INTEGER DEFAULT 0
+    );
+    CREATE TABLE cards (
+        card_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+        name      TEXT,
+        series    TEXT,
+        age       TEXT,
+        image_url TEXT,
+        rarity    INTEGER,
+        value     INTEGER,
+        owner_id  INTEGER
+    );
+    CREATE TABLE inventory (
+        user_id INTEGER,
+        card_id INTEGER,
+        PRIMARY KEY(user_id, card_id)
+    );
+"""
+
+
+def upgrade(cards):
+    """build an old-style database holding cards (card_id, name, series, owner_id), then migrate it."""
+    path = temp_db_path()
+    conn = sqlite3.connect(path)
+    conn.executescript(OLD_SCHEMA)
+    conn.executemany("""
+        INSERT INTO cards (card_id, name, series, age, image_url, rarity, value, owner_id)
+        VALUES (?, ?, ?, 'unknown', '', 4, 1200, ?)
+    """, cards)
+    conn.executemany(
+        "INSERT INTO inventory (user_id, card_id) VALUES (?, ?)",
+        [(owner, card_id) for card_id, _, _, owner in cards if owner is not None],
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO users (user_id) VALUES (?)",
+        [(owner,) for *_, owner in cards if owner is not None],
+    )
+    conn.commit()
+    conn.close()
+
+    bot_mod = load_bot(path)
+    asyncio.run(bot_mod.setup_db())
+    bot_mod.db.close()
+    return sqlite3.connect(path)
+
+
+def test_duplicates_owned_by_different_players_keep_their_owner():
+    conn = upgrade([
+        (1, "Asuka", "Eva", 1),
+        (2, "Asuka", "Eva", 2),
+    ])
+
+    claims = conn.execute("SELECT card_id, user_id FROM claims ORDER BY card_id").fetchall()
+    assert claims == [(1, 1), (2, 2)]
+    names = conn.execute("SELECT card_id, name FROM cards ORDER BY card_id").fetchall()
+    assert names == [(1, "Asuka"), (2, "Asuka (#2)")]
+    stats = conn.execute("SELECT user_id, card_count FROM user_stats ORDER BY user_id").fetchall()
+    assert stats == [(1, 1), (2, 1)]
+
+
+def test_unowned_and_same_owner_duplicates_fold():
+    conn = upgrade([
+        (1, "Asuka", "Eva", None),
+        (2, "Asuka", "Eva", 7),
+        (3, "Asuka", "Eva", 7),
+        (4, "Shinji", "Eva", None),
+        (5, "Shinji", "Eva", None),
+    ])
+
+    cards = conn.execute("SELECT card_id, name FROM cards ORDER BY card_id").fetchall()
+    assert cards == [(2, "Asuka"), (4, "Shinji")]
+    assert conn.execute("SELECT card_id, user_id FROM claims").fetchall() == [(2, 7)]